@@ -0,0 +1,73 @@
+"""Decode throughput of the chunk compression types, on the same chunks.
+
+    python -m bench.codecs [CHUNKS]
+
+LZ4 chunks are decoded with the `lz4` library and with the pure Python fallback,
+they can be written only if `lz4` is installed."""
+import gzip
+import sys
+import time
+import zlib
+
+import numpy
+
+from bench.synthetic import chunk
+from minenbt import compression
+
+try:
+    from lz4 import block as lz4_block
+except ImportError:
+    lz4_block = None
+
+# lz4-java LZ4BlockOutputStream default block size
+_LZ4_BLOCK_SIZE = 64 * 1024
+
+
+def lz4_blocks(data: bytes) -> bytes:
+    """Compress `data` as lz4-java `LZ4BlockOutputStream` does (checksums not computed)."""
+    out = bytearray()
+    for start in range(0, len(data), _LZ4_BLOCK_SIZE):
+        raw = data[start : start + _LZ4_BLOCK_SIZE]
+        packed = lz4_block.compress(raw, store_size=False)
+        out += b"LZ4Block" + bytes([0x20]) + len(packed).to_bytes(4, "little")
+        out += len(raw).to_bytes(4, "little") + bytes(4) + packed
+    # end of stream
+    return bytes(out + b"LZ4Block" + bytes([0x10]) + bytes(12))
+
+
+def measure(name: str, kind: int, payloads: list[bytes], chunks: list[bytes]) -> None:
+    if compression.decompress(kind, payloads[0]) != chunks[0]:
+        raise ValueError(f"{name} decoded a different chunk")
+    size = sum(len(c) for c in chunks)
+    start = time.perf_counter()
+    for payload in payloads:
+        compression.decompress(kind, payload)
+    elapsed = time.perf_counter() - start
+    ratio = size / sum(len(p) for p in payloads)
+    print(f"{name:<12}: {size / elapsed / 2**20:8.1f} MiB/s (ratio {ratio:4.1f}x)")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    rng = numpy.random.default_rng(0)
+    chunks = [chunk(rng, i, 0, 24).to_nbt(compressed=False) for i in range(count)]
+    size = sum(len(c) for c in chunks)
+    print(f"{count} chunks, {size / 2**20:.1f} MiB of NBT data")
+    print(f"zlib from {compression._zlib.__name__}, lz4 {'installed' if lz4_block else 'missing'}")
+    measure("gzip", compression.GZIP, [gzip.compress(c) for c in chunks], chunks)
+    measure("zlib", compression.ZLIB, [zlib.compress(c) for c in chunks], chunks)
+    measure("none", compression.NONE, chunks, chunks)
+    if lz4_block is None:
+        print("lz4         : skipped, the lz4 library is not installed")
+        return
+    payloads = [lz4_blocks(c) for c in chunks]
+    measure("lz4", compression.LZ4, payloads, chunks)
+    compression._lz4_block = None
+    try:
+        measure("lz4 python", compression.LZ4, payloads, chunks)
+    finally:
+        compression._lz4_block = lz4_block
+
+
+if __name__ == "__main__":
+    main()
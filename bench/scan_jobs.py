@@ -0,0 +1,38 @@
+"""Time `reduce_chunks` (the blockstats scan) with 1, 2 and 4 processes.
+
+    python -m bench.scan_jobs [SAVE_FOLDER]
+
+Without a save folder a synthetic one is written in a temporary folder.
+The speedup is bounded by the number of CPUs and by the number of regions."""
+import os
+import sys
+import tempfile
+import time
+from operator import add
+from pathlib import Path
+
+from bench.synthetic import make_world
+from minenbt import Dimension
+from minenbt.cli.blockstats import PATHS, chunk_blocks
+from minenbt.scan import reduce_chunks
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(sys.argv[1]) if len(sys.argv) > 1 else make_world(Path(tmp), regions=8)
+        world = Dimension(folder)
+        print(f"{len(list(world.regions.xzs()))} regions, {os.cpu_count()} CPUs")
+        baseline = None
+        for jobs in (1, 2, 4):
+            start = time.perf_counter()
+            histogram = reduce_chunks(world.regions, chunk_blocks, add, jobs, paths=PATHS)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"jobs={jobs}: {elapsed:7.2f} s, speedup {baseline / elapsed:4.2f}x,"
+                f" {int(histogram.counts.sum()):,d} blocks"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""A synthetic save folder for the benchmarks: regions of stone with ores, air and water."""
+from pathlib import Path
+
+import numpy
+from amulet_nbt import ByteTag, CompoundTag, IntTag, ListTag, LongArrayTag, LongTag, StringTag
+
+from minenbt.file_formats import AnvilFile, Chunk
+from minenbt.utils import pack_longs
+
+BLOCKS = [
+    "minecraft:stone",
+    "minecraft:deepslate",
+    "minecraft:coal_ore",
+    "minecraft:iron_ore",
+    "minecraft:diamond_ore",
+    "minecraft:water",
+    "minecraft:air",
+]
+
+
+def chunk(rng: numpy.random.Generator, cx: int, cz: int, sections: int) -> Chunk:
+    tags = [CompoundTag({"Y": ByteTag(-5)})]
+    for y in range(-4, sections - 4):
+        states = rng.choice(len(BLOCKS), size=4096, p=[0.6, 0.2, 0.05, 0.03, 0.01, 0.06, 0.05])
+        biomes = ListTag([StringTag("minecraft:plains"), StringTag("minecraft:river")])
+        tags.append(
+            CompoundTag(
+                {
+                    "Y": ByteTag(y),
+                    "block_states": CompoundTag(
+                        {
+                            "palette": ListTag(
+                                [CompoundTag({"Name": StringTag(b)}) for b in BLOCKS]
+                            ),
+                            "data": LongArrayTag(pack_longs(states, 4)),
+                        }
+                    ),
+                    "biomes": CompoundTag(
+                        {
+                            "palette": biomes,
+                            "data": LongArrayTag(pack_longs(rng.integers(0, 2, 64), 1)),
+                        }
+                    ),
+                }
+            )
+        )
+    return Chunk(
+        {
+            "DataVersion": IntTag(3120),
+            "xPos": IntTag(cx),
+            "zPos": IntTag(cz),
+            "Status": StringTag("minecraft:full"),
+            "InhabitedTime": LongTag(0),
+            "sections": ListTag(tags),
+        }
+    )
+
+
+def make_world(folder: Path, regions=4, chunks=16, sections=8, seed=0) -> Path:
+    """Write `regions` regions of `chunks` × `chunks` chunks in `folder`, return it."""
+    rng = numpy.random.default_rng(seed)
+    (folder / "region").mkdir(parents=True, exist_ok=True)
+    for rx in range(regions):
+        path = folder / "region" / f"r.{rx}.0.mca"
+        path.write_bytes(b"\0" * 8192)
+        region = AnvilFile(path)
+        for cx in range(chunks):
+            for cz in range(chunks):
+                region.set_chunk(cx, cz, chunk(rng, rx * 32 + cx, cz, sections))
+        region.save()
+        region.close()
+    return folder
@@ -1,4 +1,5 @@
 import argparse
+from multiprocessing import freeze_support
 
 import minenbt.cli as cli
 from minenbt import SaveFolder
@@ -31,6 +32,46 @@ def __add_center_distance(parser):
     )
 
 
+def __add_jobs(parser):
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Scan regions with this number of processes (0 = one per CPU, default=1)",
+    )
+
+
+def __add_chunk_filter(parser):
+    parser.add_argument(
+        "--min-inhabited",
+        type=int,
+        help="Skip chunks where players spent less than this time (in ticks, 20 = 1 second).",
+    )
+    parser.add_argument(
+        "--status",
+        action="append",
+        help="Read only chunks with this generation status (es: full), can be repeated.",
+    )
+
+
+def __add_incremental(parser):
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Store results in the save folder, next runs read only the changed chunks.",
+    )
+
+
+def __add_entity_index(parser):
+    parser.add_argument(
+        "-x",
+        "--index",
+        action="store_true",
+        help="Use (and update) the entity index stored in the save folder.",
+    )
+
+
 def main():
     parser = argparse.ArgumentParser("minenbt")
     parser.add_argument("save_folder", type=SaveFolder)
@@ -42,6 +83,19 @@ def main():
     biome_parser = subparsers.add_parser("biome", help=cli.biome_analysis.__doc__.strip())
     biome_parser.set_defaults(func=cli.biome_analysis.main)
     __add_dimension(biome_parser)
+    __add_jobs(biome_parser)
+    __add_incremental(biome_parser)
+    __add_chunk_filter(biome_parser)
+    biome_parser.add_argument(
+        "-y", "--by-y", action="store_true", help="Show the biomes of every 16 blocks band"
+    )
+    biome_parser.add_argument(
+        "-f", "--find", help="Find the nearest patches of this biome (es: mushroom_fields)"
+    )
+    __add_center_distance(biome_parser)
+    biome_parser.add_argument(
+        "-n", "--limit", type=int, default=1, help="Number of patches to find (default=1)"
+    )
     # add_to_inventory
     add_parser = subparsers.add_parser("add", help=cli.add_to_inventory.__doc__.strip())
     add_parser.set_defaults(func=cli.add_to_inventory.main)
@@ -54,6 +108,8 @@ def main():
     )
     containers_parser.set_defaults(func=cli.containers_list.main)
     __add_dimension(containers_parser)
+    __add_jobs(containers_parser)
+    __add_incremental(containers_parser)
     __add_center_distance(containers_parser)
     containers_group = containers_parser.add_mutually_exclusive_group()
     containers_group.add_argument(
@@ -62,22 +118,57 @@ def main():
     containers_group.add_argument(
         "-o", "--only_loot", action="store_true", help="Print only chests with loot."
     )
+    __add_entity_index(containers_parser)
     # mobs
     mobs_parser = subparsers.add_parser("mobs", help=cli.mobs_list.__doc__.strip())
     mobs_parser.set_defaults(func=cli.mobs_list.main)
     __add_dimension(mobs_parser)
+    __add_jobs(mobs_parser)
+    __add_incremental(mobs_parser)
     __add_center_distance(mobs_parser)
+    __add_entity_index(mobs_parser)
     # structures
     structures_parser = subparsers.add_parser("structures", help=cli.structure_list.__doc__.strip())
     structures_parser.set_defaults(func=cli.structure_list.main)
     __add_dimension(structures_parser)
+    __add_jobs(structures_parser)
     __add_center_distance(structures_parser)
+    __add_chunk_filter(structures_parser)
     # block
     block_parser = subparsers.add_parser("block", help=cli.find_block.__doc__.strip())
     block_parser.set_defaults(func=cli.find_block.main)
     __add_dimension(block_parser)
+    __add_jobs(block_parser)
     __add_center_distance(block_parser)
-    block_parser.add_argument("block_id", help="Block ID")
+    __add_chunk_filter(block_parser)
+    block_parser.add_argument(
+        "block_id", nargs="+", help="Block IDs or glob patterns (es: minecraft:*_ore)"
+    )
+    block_parser.add_argument(
+        "-n", "--limit", type=int, help="Stop after this number of blocks (nearest first)."
+    )
+    block_parser.add_argument(
+        "-x",
+        "--index",
+        action="store_true",
+        help="Use (and update) the block index stored in the save folder.",
+    )
+    # blockstats
+    blockstats_parser = subparsers.add_parser("blockstats", help=cli.blockstats.__doc__.strip())
+    blockstats_parser.set_defaults(func=cli.blockstats.main)
+    __add_dimension(blockstats_parser)
+    __add_jobs(blockstats_parser)
+    __add_center_distance(blockstats_parser)
+    __add_chunk_filter(blockstats_parser)
+    blockstats_parser.add_argument(
+        "block_id", nargs="*", help="Report only these IDs or glob patterns (es: *_ore)"
+    )
+    blockstats_parser.add_argument(
+        "--csv", dest="csv_file", help="Save the counts by block and y to this CSV file."
+    )
+    blockstats_parser.add_argument(
+        "--json", dest="json_file", help="Save the counts by block and y to this JSON file."
+    )
     # repair
     repair_parser = subparsers.add_parser("repair", help=cli.repair.__doc__.strip())
     __add_uuid(repair_parser)
@@ -87,6 +178,24 @@ def main():
     block_parser.set_defaults(func=cli.slime.main)
     __add_dimension(block_parser)
     __add_center_distance(block_parser)
+    block_parser.add_argument(
+        "-n", "--limit", type=int, help="Print only this number of chunks (nearest first)."
+    )
+    block_parser.add_argument(
+        "-a",
+        "--area",
+        action="store_true",
+        help="Check every chunk within the distance, generated or not.",
+    )
+    block_parser.add_argument(
+        "--ascii", action="store_true", help="Print a map of the chunks (# = slime chunk)."
+    )
+    block_parser.add_argument("--png", help="Save a map of the chunks to this PNG file.")
+    block_parser.add_argument(
+        "--afk",
+        action="store_true",
+        help="Find the spot with the most slime chunks within 128 blocks.",
+    )
     # dumpr
     dumpr_parser = subparsers.add_parser("dumpr", help=cli.dumpr.__doc__.strip())
     dumpr_parser.set_defaults(func=cli.dumpr.main)
@@ -132,4 +241,5 @@ def main():
 
 
 if __name__ == "__main__":
+    freeze_support()
     main()
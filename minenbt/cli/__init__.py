@@ -1,5 +1,6 @@
 from . import add_to_inventory  # noqa
 from . import biome_analysis  # noqa
+from . import blockstats  # noqa
 from . import containers_list  # noqa
 from . import dumpr  # noqa
 from . import dumpl  # noqa
@@ -1,13 +1,24 @@
 """
-Count the number of biomes in a dimension.
+Count the biomes (4×4×4 cells) in a dimension.
 """
-from collections import Counter
-from typing import TYPE_CHECKING
+from operator import add
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy
+
+from minenbt.file_formats import BIOME_IDS
+from minenbt.scan import reduce_chunks
+from minenbt.utils import Coord, Histogram, chunk_rings
 
 if TYPE_CHECKING:
-    from minenbt import SaveFolder
+    from collections.abc import Iterator
+
+    from minenbt import AnvilFolder, Chunk, ChunkFilter, Dimension, SaveFolder
+
+from .utils import chunk_filter, get_pos, get_world, progress_printer, scan_cache
 
-from .utils import get_world
+# tags read by chunk_biomes and chunk_columns
+PATHS = ("DataVersion", "sections/Y", "sections/biomes")
 
 # https://minecraft.fandom.com/Java_Edition_data_values#Biomes
 BIOMES = {
@@ -93,24 +104,226 @@ BIOMES = {
 }
 
 
-def main(save_folder: "SaveFolder", dimension) -> int:
+def chunk_biomes(_coord: "Coord", chunk: "Chunk") -> Histogram:
+    """Count the 4×4×4 biome cells of `chunk`, by cell y (block y >> 2)."""
+    histogram = Histogram(BIOME_IDS)
+    ys, ids = [], []
+    for section in chunk.sections():
+        cells = section.biome_ids()
+        if cells is not None:
+            ids.append(cells)
+            cys = section["Y"].py_int * 4 + numpy.arange(4)
+            ys.append(numpy.broadcast_to(cys[:, None, None], cells.shape))
+    if ids:
+        histogram.add(numpy.concatenate(ys, axis=None), numpy.concatenate(ids, axis=None))
+    return histogram
+
+
+def print_totals(counts: "numpy.ndarray", swidth: int) -> None:
+    total = counts.sum()
+    for i in numpy.argsort(-counts, kind="stable"):
+        if counts[i]:
+            print(
+                "{0:<{swidth}}: {1:>12,d} {2:>6.2%}".format(
+                    BIOME_IDS.name(i), int(counts[i]), counts[i] / total, swidth=swidth
+                )
+            )
+
+
+class Patch(NamedTuple):
+    """A connected area of a biome, on a grid of 4×4 blocks columns."""
+
+    nearest: Coord  # center of the nearest column
+    distance: float
+    columns: int
+    complete: bool  # False if the patch can go beyond the search distance
+
+
+def chunk_columns(chunk: "Chunk", biome_id: int) -> "numpy.ndarray":
+    """Return a (z, x) 4×4 mask of the columns of `chunk` with `biome_id` at any height."""
+    mask = numpy.zeros((4, 4), dtype=bool)
+    for section in chunk.sections():
+        cells = section.biome_ids()
+        if cells is not None:
+            mask |= (cells == biome_id).any(axis=0)
+    return mask
+
+
+def _max_ring(world: "AnvilFolder", ccx: int, ccz: int) -> int:
+    """Return the ring (see `chunk_rings`) of the farthest chunk that can be generated."""
+    last = -1
+    for rx, rz in world.xzs():
+        x0, z0 = rx << 5, rz << 5
+        last = max(last, abs(ccx - x0), abs(ccx - x0 - 31), abs(ccz - z0), abs(ccz - z0 - 31))
+    return last
+
+
+def find_patches(
+    world: "AnvilFolder",
+    biome: str,
+    center: Coord,
+    limit: int = 1,
+    distance: int | None = None,
+    cfilter: "ChunkFilter | None" = None,
+) -> "Iterator[Patch]":
+    """Yield the patches of `biome` from the nearest to `center`, at most `limit` of them.
+
+    Chunks are read ring by ring (see `chunk_rings`), the columns of the biome are merged
+    with the adjacent ones (union-find). A patch without columns in the last ring can't grow
+    and chunks in the next rings are farther: the search stops when `limit` patches
+    can't be beaten by the next rings. Chunks rejected by `cfilter` are treated as missing."""
+    biome_id = BIOME_IDS.id(biome)
+    start = Coord(center.x, 0, center.z)
+    regions = set(world.xzs())
+    last_ring = _max_ring(world, center.x >> 4, center.z >> 4)
+    # column (x >> 2, z >> 2) -> parent column
+    parents: dict[tuple[int, int], tuple[int, int]] = {}
+    # root column -> distance, nearest column, columns
+    roots: dict[tuple[int, int], tuple[float, tuple[int, int], int]] = {}
+    open_roots: set[tuple[int, int]] = set()
+    done: list[Patch] = []
+
+    def find(c: tuple[int, int]) -> tuple[int, int]:
+        while parents[c] != c:
+            parents[c] = parents[parents[c]]
+            c = parents[c]
+        return c
+
+    def union(a: tuple[int, int], b: tuple[int, int]) -> None:
+        a, b = find(a), find(b)
+        if a != b:
+            da, na, sa = roots.pop(a)
+            db, nb, sb = roots.pop(b)
+            parents[b] = a
+            roots[a] = min((da, na), (db, nb)) + (sa + sb,)
+
+    def patch(root: tuple[int, int], complete=True) -> Patch:
+        d, (gx, gz), columns = roots[root]
+        return Patch(Coord(gx * 4 + 2, center.y, gz * 4 + 2), d, columns, complete)
+
+    # open patches are complete only when every generated chunk has been read
+    complete = False
+    for k, ring in enumerate(chunk_rings(center.x, center.z)):
+        if k > last_ring:
+            complete = True
+            break
+        # nothing in this ring can be nearer than this
+        if distance is not None and max(0, 16 * k - 15) > distance:
+            break
+        by_region: dict[tuple[int, int], list[tuple[int, int]]] = {}
+        for cx, cz in ring:
+            if (cx >> 5, cz >> 5) in regions:
+                by_region.setdefault((cx >> 5, cz >> 5), []).append((cx & 31, cz & 31))
+        touched = []
+        for (rx, rz), coords in by_region.items():
+            # nothing is cached, the next ring opens the region again
+            with world.peek(rx, rz) as region:
+                chunks = region.read_chunks(
+                    coords, cache=False, paths=PATHS, chunk_filter=cfilter
+                )
+            for (cx, cz), chunk in chunks.items():
+                if not chunk:
+                    continue
+                gzs, gxs = numpy.nonzero(chunk_columns(chunk, biome_id))
+                gxs += (rx * 32 + cx) * 4
+                gzs += (rz * 32 + cz) * 4
+                for gx, gz in zip(gxs.tolist(), gzs.tolist()):
+                    d = start.distance(Coord(gx * 4 + 2, 0, gz * 4 + 2))
+                    if distance is not None and d > distance:
+                        continue
+                    parents[gx, gz] = (gx, gz)
+                    roots[gx, gz] = (d, (gx, gz), 1)
+                    touched.append((gx, gz))
+        for gx, gz in touched:
+            for n in ((gx - 1, gz), (gx + 1, gz), (gx, gz - 1), (gx, gz + 1)):
+                if n in parents:
+                    union((gx, gz), n)
+        # patches left open by the previous ring and not touched by this one are complete
+        still_open = {find(c) for c in touched}
+        for root in {find(r) for r in open_roots} - still_open:
+            done.append(patch(root))
+            del roots[root]
+        open_roots = still_open
+        done.sort(key=lambda p: p.distance)
+        # new patches will be at least this far
+        next_bound = 16 * (k + 1) - 15
+        if (
+            len(done) >= limit
+            and done[limit - 1].distance <= next_bound
+            and all(roots[r][0] >= done[limit - 1].distance for r in open_roots)
+        ):
+            break
+    done += [patch(r, complete) for r in open_roots]
+    yield from sorted(done, key=lambda p: p.distance)[:limit]
+
+
+def find_main(
+    world: "Dimension", biome: str, center: Coord, distance, limit, cfilter: "ChunkFilter | None"
+) -> int:
+    if ":" not in biome:
+        biome = "minecraft:" + biome
+    print(f"Searching {biome}...", end="\r")
+    found = 0
+    patches = find_patches(world.regions, biome, center, limit, distance, cfilter)
+    for found, patch in enumerate(patches, 1):
+        if found == 1:
+            print(f"Nearest {biome} patches:")
+        area = "{}{:,d}".format("" if patch.complete else "at least ", patch.columns * 16)
+        print(
+            f"{patch.nearest.x}, {patch.nearest.z} - {patch.distance:.0f} blocks away"
+            f" - {area} blocks²"
+        )
+    if not found:
+        print(f"{biome} not found")
+    return 0
+
+
+def main(
+    save_folder: "SaveFolder",
+    dimension,
+    jobs=1,
+    incremental=False,
+    by_y=False,
+    find=None,
+    center=None,
+    distance=None,
+    limit=1,
+    min_inhabited=None,
+    status=None,
+) -> int:
     world = get_world(save_folder, dimension)
-    biomes: Counter[int] = Counter()
+    cfilter = chunk_filter(min_inhabited, status)
+    if find:
+        pos = get_pos(save_folder, dimension, center)
+        if not pos:
+            print("Single player position not found, please specify --center")
+            return 99
+        return find_main(world, find, Coord(*pos), distance, limit, cfilter)
     print("Reading world...", end="\r")
-    lregions = len(list(world.regions.all()))
-    i = 0
-    for _rx, _ry, region in world.regions.all():
-        i += 1
-        print(f"Reading world... {i:0>3}/{lregions}", end="\r")
-        for _, _, chunk in region.chunks():
-            if chunk:
-                biomes.update(
-                    [p.py_str for s in chunk.sections() for p in s["biomes"]["palette"].py_list]
-                )
+    scan = "regions:biome-cells" if cfilter is None else f"regions:biome-cells:{cfilter}"
+    cache = scan_cache(world, scan, incremental)
+    biomes: Histogram = reduce_chunks(
+        world.regions,
+        chunk_biomes,
+        add,
+        jobs,
+        progress=progress_printer("Reading world"),
+        cache=cache,
+        paths=PATHS,
+        chunk_filter=cfilter,
+    ) or Histogram(BIOME_IDS)
 
-    print("Biomes:                         \n")
+    print("Biomes (4×4×4 cells):           \n")
     # must be long enought to overwrite last line
-    swidth = max(len(s) for s in biomes) + 1
-    for biome, value in biomes.most_common():
-        print("{0:<{swidth}}: {1:>10,d}".format(biome, value, swidth=swidth))
+    if not biomes.counts.size:
+        return 0
+    totals = biomes.counts.sum(axis=0)
+    swidth = max(len(BIOME_IDS.name(i)) for i in numpy.flatnonzero(totals)) + 1
+    print_totals(totals, swidth)
+    if by_y:
+        # 4 cells high every section
+        bands = (biomes.ymin + numpy.arange(biomes.counts.shape[0])) >> 2
+        for band in numpy.unique(bands)[::-1].tolist():
+            print(f"\ny {band * 16} to {band * 16 + 15}:")
+            print_totals(biomes.counts[bands == band].sum(axis=0), swidth)
     return 0
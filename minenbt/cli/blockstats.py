@@ -0,0 +1,123 @@
+"""
+Count blocks by id and Y level (es: ore distribution).
+"""
+import csv
+import json
+from fnmatch import fnmatchcase
+from operator import add
+from typing import TYPE_CHECKING
+
+import numpy
+
+from minenbt.file_formats import BLOCK_IDS
+from minenbt.scan import reduce_chunks
+from minenbt.utils import Histogram
+
+from .utils import chunk_filter, get_pos, get_world, progress_printer
+
+if TYPE_CHECKING:
+    from minenbt import Chunk, SaveFolder
+    from minenbt.utils import Coord
+
+# tags read by chunk_blocks
+PATHS = ("DataVersion", "sections/Y", "sections/block_states")
+
+
+def chunk_blocks(_coord: "Coord", chunk: "Chunk") -> Histogram:
+    """Count the blocks of `chunk`, by block y."""
+    histogram = Histogram(BLOCK_IDS)
+    for section in chunk.sections():
+        states = section.states()
+        if states is None:
+            continue
+        palette, indexes = states
+        # one bincount for the whole section: row = y within the section, column = palette index
+        layers = numpy.arange(16, dtype=numpy.int64)[:, None, None] * len(palette)
+        counts = numpy.bincount((layers + indexes).reshape(-1), minlength=16 * len(palette))
+        histogram.add_counts(
+            section["Y"].py_int * 16, BLOCK_IDS.ids(palette), counts.reshape(16, len(palette))
+        )
+    return histogram
+
+
+def write_csv(filename: str, histogram: Histogram, ids: "list[int]") -> None:
+    with open(filename, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["block", "y", "count"])
+        for i in ids:
+            for row in numpy.flatnonzero(histogram.counts[:, i]).tolist():
+                writer.writerow(
+                    [BLOCK_IDS.name(i), histogram.ymin + row, int(histogram.counts[row, i])]
+                )
+
+
+def write_json(filename: str, histogram: Histogram, ids: "list[int]") -> None:
+    report = {}
+    for i in ids:
+        rows = numpy.flatnonzero(histogram.counts[:, i]).tolist()
+        report[BLOCK_IDS.name(i)] = {
+            "total": int(histogram.counts[:, i].sum()),
+            "y": {str(histogram.ymin + r): int(histogram.counts[r, i]) for r in rows},
+        }
+    with open(filename, "w") as jsonfile:
+        json.dump(report, jsonfile, indent="  ")
+
+
+def main(
+    save_folder: "SaveFolder",
+    dimension,
+    center,
+    distance,
+    block_id: "list[str]",
+    jobs=1,
+    csv_file=None,
+    json_file=None,
+    min_inhabited=None,
+    status=None,
+) -> int:
+    world = get_world(save_folder, dimension)
+    pos = get_pos(save_folder, dimension, center) if distance else None
+    print("Reading world...", end="\r")
+    blocks: Histogram = reduce_chunks(
+        world.regions,
+        chunk_blocks,
+        add,
+        jobs,
+        pos,
+        distance if pos else None,
+        progress=progress_printer("Reading world"),
+        paths=PATHS,
+        chunk_filter=chunk_filter(min_inhabited, status),
+    ) or Histogram(BLOCK_IDS)
+
+    print("Blocks:                         \n")
+    # must be long enought to overwrite last line
+    if not blocks.counts.size:
+        return 0
+    totals = blocks.counts.sum(axis=0)
+    patterns = [b if ":" in b else "minecraft:" + b for b in block_id]
+    ids = [
+        i
+        for i in numpy.argsort(-totals, kind="stable").tolist()
+        if totals[i]
+        and (not patterns or any(fnmatchcase(BLOCK_IDS.name(i), p) for p in patterns))
+    ]
+    swidth = max((len(BLOCK_IDS.name(i)) for i in ids), default=0) + 1
+    for i in ids:
+        rows = numpy.flatnonzero(blocks.counts[:, i])
+        print(
+            "{0:<{swidth}}: {1:>14,d} (y {2} to {3})".format(
+                BLOCK_IDS.name(i),
+                int(totals[i]),
+                blocks.ymin + int(rows[0]),
+                blocks.ymin + int(rows[-1]),
+                swidth=swidth,
+            )
+        )
+    if csv_file:
+        write_csv(csv_file, blocks, ids)
+        print(f"\nSaved {csv_file}")
+    if json_file:
+        write_json(json_file, blocks, ids)
+        print(f"\nSaved {json_file}")
+    return 0
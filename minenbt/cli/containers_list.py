@@ -2,54 +2,132 @@
 Prints all containers (chest, barrel, minecart with chest).
 """
 from collections import Counter
+from functools import partial
+from typing import TYPE_CHECKING
 
 from amulet_nbt import ListTag
 
-from .utils import get_pos, get_world, iterate_chunks
+from minenbt.index import EntityIndex
+from minenbt.utils import Coord
 
+from .utils import (
+    get_pos,
+    get_world,
+    index_rows,
+    scan_cache,
+    scan_chunks,
+    update_entity_index,
+)
 
-def print_entry(e, empty, only_loot):
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from minenbt import Chunk, Dimension, SaveFolder
+
+# tags read by chunk_containers
+PATHS = (
+    "TileEntities",
+    "Entities/id",
+    "Entities/Pos",
+    "Entities/Items",
+    "Entities/LootTable",
+)
+
+
+def _title(s: str) -> str:
+    return s.replace("minecraft:", "").replace("_", " ").title()
+
+
+def entry_lines(e, empty, only_loot) -> list[str]:
+    """Return the lines describing a container, if it should be printed."""
     if "Pos" in e:
         location = "{:s} at ({:0.0f}, {:0.0f}, {:0.0f})".format(
-            e["id"].py_str.replace("minecraft:", "").replace("_", " ").title(),
-            *[v.py_float for v in e["Pos"].py_list]
+            _title(e["id"].py_str), *[v.py_float for v in e["Pos"].py_list]
         )
     else:
-        location = "{:s} at ({x:0.0f}, {y:0.0f}, {z:0.0f})".format(
-            e["id"].py_str.replace("minecraft:", "").replace("_", " ").title(), **e
+        location = "{:s} at ({:d}, {:d}, {:d})".format(
+            _title(e["id"].py_str), *[e[k].py_int for k in ("x", "y", "z")]
         )
     if "Items" in e and not only_loot:
         content = Counter()
         for i in e["Items"]:
-            content.update({i["id"]: i["Count"]})
+            content.update({i["id"].py_str: i["Count"].py_int})
         if content:
-            print(location)
-            for k, v in content.most_common():
-                print("- {}: {:d}".format(k.replace("minecraft:", "").replace("_", " ").title(), v))
+            return [location] + [
+                "- {}: {:d}".format(_title(k), v) for k, v in content.most_common()
+            ]
         elif empty:
-            print(location)
-            print(" Empty")
+            return [location, " Empty"]
     elif "LootTable" in e:
-        print(location)
-        print(
-            "- Loot from {} table".format(
-                e["LootTable"]
-                .py_str.split("/")[-1]
-                .replace("minecraft:", "")
-                .replace("_", " ")
-                .title()
-            )
-        )
+        return [
+            location,
+            "- Loot from {} table".format(_title(e["LootTable"].py_str.split("/")[-1])),
+        ]
+    return []
 
 
-def main(save_folder, dimension, center, distance, empty, only_loot) -> int:
+def chunk_containers(empty, only_loot, _coord: "Coord", chunk: "Chunk") -> list[str] | None:
+    lines = []
+    for e in (
+        chunk.get("TileEntities", ListTag()).py_list + chunk.get("Entities", ListTag()).py_list
+    ):
+        if "Items" in e or "LootTable" in e:
+            lines.extend(entry_lines(e, empty, only_loot))
+    return lines or None
+
+
+def index_containers(
+    world: "Dimension",
+    entity_index: EntityIndex,
+    empty,
+    only_loot,
+    pos: tuple[int, int, int] | None,
+    distance,
+) -> "Iterator[list[str]]":
+    """Like `scan_chunks` with `chunk_containers`, but only the chunks
+    with containers (from `entity_index`, closed when done) are decoded."""
+    rows = index_rows(entity_index, pos, distance, EntityIndex.ITEMS | EntityIndex.LOOT)
+    chunks: dict[tuple[int, int], set[tuple[int, int]]] = {}
+    for rx, rz, cx, cz in entity_index.chunk[rows].tolist():
+        chunks.setdefault((rx, rz), set()).add((cx, cz))
+    entity_index.close()
+    for (rx, rz), coords in sorted(chunks.items()):
+        with world.entities.peek(rx, rz) as region:
+            decoded = region.read_chunks(coords, cache=False, paths=PATHS)
+        for (cx, cz), chunk in sorted(decoded.items()):
+            if chunk:
+                lines = chunk_containers(
+                    empty, only_loot, Coord.compose((rx, rz), (cx, cz)), chunk
+                )
+                if lines:
+                    yield lines
+
+
+def main(
+    save_folder: "SaveFolder",
+    dimension,
+    center,
+    distance,
+    empty,
+    only_loot,
+    jobs=1,
+    incremental=False,
+    index=False,
+) -> int:
     world = get_world(save_folder, dimension)
     pos = get_pos(save_folder, dimension, center)
+    if index:
+        entity_index = update_entity_index(world)
+        found = index_containers(world, entity_index, empty, only_loot, pos, distance)
+    else:
+        func = partial(chunk_containers, empty, only_loot)
+        cache = scan_cache(world, f"entities:containers:{empty}:{only_loot}", incremental)
+        found = (
+            lines
+            for _, lines in scan_chunks(world.entities, func, pos, distance, jobs, cache, PATHS)
+        )
     print("\nEntities:")
-    for _, chunk in iterate_chunks(world.entities, pos, distance):
-        for e in (
-            chunk.get("TileEntities", ListTag()).py_list + chunk.get("Entities", ListTag()).py_list
-        ):
-            if "Items" in e or "LootTable" in e:
-                print_entry(e, empty, only_loot)
+    for lines in found:
+        for line in lines:
+            print(line)
     return 0
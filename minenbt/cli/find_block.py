@@ -1,36 +1,151 @@
 """
-Find blocks by id (es: minecraft:diamond_ore).
+Find blocks by id (es: minecraft:diamond_ore or *_ore).
 """
+import heapq
+from functools import partial
 from typing import TYPE_CHECKING
 
+from minenbt.index import BlockIndex
 from minenbt.utils import Coord
 
-from .utils import get_pos, get_world, iterate_chunks
+from .utils import _CHUNK_DIAGONAL, chunk_filter, get_pos, get_world, progress_printer, scan_chunks
 
 if TYPE_CHECKING:
-    from minenbt import SaveFolder
+    from collections.abc import Iterable, Iterator
 
+    from minenbt import Chunk, ChunkFilter, Dimension, SaveFolder
+    from minenbt.file_formats import Section
 
-def main(save_folder: "SaveFolder", dimension, center, distance, block_id) -> int:
+# tags read by chunk_matches
+PATHS = ("DataVersion", "sections/Y", "sections/block_states")
+
+
+def _print_match(name: str, c: Coord, distance: float | None) -> None:
+    sdist = ""
+    if distance is not None:
+        sdist = f" - {distance:.0f} blocks away"
+    print(f"Found {name} at {c}{sdist}")
+
+
+def section_matches(
+    block_ids: list[str], cpos: Coord | None, base_chunk: Coord, sections: "Iterable[Section]"
+) -> list[tuple[float | None, Coord, str]] | None:
+    """Return `distance, coord, block` of every block matching `block_ids` in the sections."""
+    matches = []
+    for section in sections:
+        coords, names, distances = section.query(block_ids, (base_chunk.x, base_chunk.z), cpos)
+        for i, name in enumerate(names):
+            d = None if distances is None else float(distances[i])
+            matches.append((d, Coord(*coords[i].tolist()), name))
+    return matches or None
+
+
+def chunk_matches(
+    block_ids: list[str], cpos: Coord | None, base_chunk: Coord, chunk: "Chunk"
+) -> list[tuple[float | None, Coord, str]] | None:
+    """Return `distance, coord, block` of every block matching `block_ids` in the chunk."""
+    return section_matches(block_ids, cpos, base_chunk, chunk.sections())
+
+
+def update_index(world: "Dimension", block_ids: list[str]):
+    """Update the block index of `world`, return the candidate sections for `block_ids`."""
+    block_index = BlockIndex(world)
+    block_index.update(progress_printer("Updating block index"))
+    candidates = block_index.candidates(block_ids)
+    block_index.close()
+    return candidates
+
+
+def index_matches(
+    world: "Dimension",
+    candidates: dict[tuple[int, int], dict[tuple[int, int], set[int]]],
+    block_ids: list[str],
+    cpos: Coord | None,
+    distance: int | None,
+    cfilter: "ChunkFilter | None" = None,
+) -> "Iterator[tuple[Coord, list[tuple[float | None, Coord, str]]]]":
+    """Like `scan_chunks` with `chunk_matches`, but only the `candidates` sections
+    (from the block index) are decoded."""
+    for (rx, rz), chunks in sorted(candidates.items()):
+        if cpos and distance:
+            start = Coord(cpos.x, 0, cpos.z)
+            chunks = {
+                c: ys
+                for c, ys in chunks.items()
+                if start.distance(Coord.compose((rx, rz), c)) <= distance
+            }
+        if not chunks:
+            continue
+        with world.regions.peek(rx, rz) as region:
+            decoded = region.read_chunks(chunks, cache=False, paths=PATHS, chunk_filter=cfilter)
+        for (cx, cz), chunk in sorted(decoded.items()):
+            if not chunk:
+                continue
+            base_chunk = Coord.compose((rx, rz), (cx, cz))
+            sections = [chunk.section_at(y) for y in sorted(chunks[cx, cz])]
+            matches = section_matches(block_ids, cpos, base_chunk, [s for s in sections if s])
+            if matches:
+                yield base_chunk, matches
+
+
+def main(
+    save_folder: "SaveFolder",
+    dimension,
+    center,
+    distance,
+    block_id: list[str],
+    limit=None,
+    jobs=1,
+    index=False,
+    min_inhabited=None,
+    status=None,
+) -> int:
     world = get_world(save_folder, dimension)
     pos = get_pos(save_folder, dimension, center)
     cpos = None
     if pos:
         cpos = Coord(*pos)
-    if "minecraft:" not in block_id:
-        block_id = "minecraft:" + block_id
+    block_ids = [b if ":" in b else "minecraft:" + b for b in block_id]
+    cfilter = chunk_filter(min_inhabited, status)
+    # with a distance, chunks are read from the nearest to the farthest
+    ordered = bool(cpos and distance) and jobs == 1 and not index
+    # heap of (distance, coord, block), not printed yet
+    matches: list[tuple[float, Coord, str]] = []
+    printed = 0
+
+    def emit(name: str, c: Coord, d: float | None) -> bool:
+        """Print a match, return True when the limit is reached."""
+        nonlocal printed
+        _print_match(name, c, d)
+        printed += 1
+        return bool(limit) and printed >= limit
 
+    if index:
+        candidates = update_index(world, block_ids)
+        results = index_matches(world, candidates, block_ids, cpos, distance, cfilter)
+    else:
+        func = partial(chunk_matches, block_ids, cpos)
+        results = scan_chunks(
+            world.regions, func, pos, distance, jobs, paths=PATHS, chunk_filter=cfilter
+        )
     print("\nBlock founds:")
-    for base_chunk, chunk in iterate_chunks(world.regions, pos, distance):
-        for section in chunk.sections():
-            if block_id not in section.blocks_available():
-                continue
-            y = section["Y"].py_int * 16
-            for (bx, by, bz), block in section.blocks():
-                sdist = ""
-                c = Coord(base_chunk.x + bx, y + by, base_chunk.z + bz)
-                if cpos:
-                    sdist = f" - {c.distance(cpos):.0f} blocks away"
-                if block_id == block:
-                    print(f"Found at {c}{sdist}")
+    for base_chunk, found in results:
+        for d, c, name in found:
+            if d is None:
+                if emit(name, c, None):
+                    return 0
+            else:
+                heapq.heappush(matches, (d, c, name))
+        if ordered and cpos:
+            # every block of the next chunks is at least this far
+            bound = Coord(base_chunk.x, 0, base_chunk.z).distance(Coord(cpos.x, 0, cpos.z))
+            bound -= _CHUNK_DIAGONAL
+            while matches and matches[0][0] <= bound:
+                d, c, name = heapq.heappop(matches)
+                if emit(name, c, d):
+                    return 0
+    while matches:
+        d, c, name = heapq.heappop(matches)
+        if emit(name, c, d):
+            return 0
     return 0
@@ -6,31 +6,86 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
 
-    from minenbt import SaveFolder
+    from minenbt import Chunk, Dimension, SaveFolder
+from minenbt.index import EntityIndex
 from minenbt.utils import Coord
 
-from .utils import get_pos, get_world, iterate_chunks
+from .utils import (
+    get_pos,
+    get_world,
+    index_rows,
+    scan_cache,
+    scan_chunks,
+    update_entity_index,
+)
 
+# tags read by chunk_mobs
+PATHS = ("Entities/id", "Entities/Pos", "Entities/Brain")
 
-def main(save_folder: "SaveFolder", dimension, center, distance) -> int:
+
+def chunk_mobs(_coord: Coord, chunk: "Chunk") -> list[tuple[str, Coord]] | None:
+    """Return `id, position` of every mob in the chunk."""
+    mobs = []
+    for e in chunk.get("Entities", ()):
+        # Filter mobs
+        if "Brain" in e:
+            mobs.append((e["id"].py_str, Coord(*[int(v.py_float) for v in e["Pos"].py_list])))
+    return mobs or None
+
+
+def _print_mob(mob_id: str, c: Coord, cpos: Coord | None) -> None:
+    sdist = ""
+    if cpos:
+        sdist = f" - {c.distance(cpos):.0f} blocks away"
+    print(
+        "{:s} at ({}){}".format(
+            mob_id.replace("minecraft:", "").replace("_", " ").title(),
+            c,
+            sdist,
+        )
+    )
+
+
+def index_mobs(world: "Dimension", cpos: Coord | None, distance) -> "list[tuple[str, Coord]]":
+    """Return `id, position` of the mobs from the entity index."""
+    entity_index = update_entity_index(world)
+    rows = index_rows(entity_index, cpos, distance, EntityIndex.BRAIN)
+    mobs = [
+        (
+            entity_index.types[entity_index.type[row]],
+            Coord(*[int(v) for v in entity_index.pos[row].tolist()]),
+        )
+        for row in rows.tolist()
+    ]
+    entity_index.close()
+    return mobs
+
+
+def main(
+    save_folder: "SaveFolder",
+    dimension,
+    center,
+    distance,
+    jobs=1,
+    incremental=False,
+    index=False,
+) -> int:
     world = get_world(save_folder, dimension)
     pos = get_pos(save_folder, dimension, center)
+    cpos = None
     if pos:
         cpos = Coord(*pos)
+    if index:
+        mobs = index_mobs(world, cpos, distance)
+        print("\nEntities:")
+        for mob_id, c in mobs:
+            _print_mob(mob_id, c, cpos)
+        return 0
     print("\nEntities:")
-    for _, chunk in iterate_chunks(world.entities, pos, distance):
-        for e in chunk.get("Entities", ()):
-            # Filter mobs
-            if "Brain" in e:
-                sdist = ""
-                c = Coord(*[int(v.py_float) for v in e["Pos"].py_list])
-                if cpos:
-                    sdist = f" - {c.distance(cpos):.0f} blocks away"
-                print(
-                    "{:s} at ({}){}".format(
-                        e["id"].py_str.replace("minecraft:", "").replace("_", " ").title(),
-                        c,
-                        sdist,
-                    )
-                )
+    cache = scan_cache(world, "entities:mobs", incremental)
+    for _, mobs in scan_chunks(
+        world.entities, chunk_mobs, pos, distance, jobs, cache, paths=PATHS
+    ):
+        for mob_id, c in mobs:
+            _print_mob(mob_id, c, cpos)
     return 0
@@ -1,69 +1,212 @@
 """
 Find slime chunks.
 """
+import struct
+import zlib
+from math import ceil, hypot
+from pathlib import Path
 from typing import TYPE_CHECKING
 
-from minenbt.utils import Coord
+import numpy as np
+
+from minenbt.utils import near_regions
 
 if TYPE_CHECKING:
     import minenbt
 
-from .utils import get_pos, get_world, iterate_chunks
-
-
-def check_chunk(seed, x, z):
-    rseed = seed + x * z * 0x4C1906 + x * 0x5AC0DB + z * z * 0x4307A7 + (z * 0x5F24F) ^ 0x3AD8025F
-    multiplier = 0x5DEECE66D
-    mask = (1 << 48) - 1
-    # scrable input seed
-    _seed = (rseed ^ multiplier) & mask
-
-    # generate a 31 bit integer
-    def _next():
-        nonlocal _seed
-        # generate next seed
-        while True:
-            oldseed = _seed
-            nextseed = (oldseed * multiplier + 0xB) & mask
-            if oldseed != nextseed:
-                break
-        _seed = nextseed
-        nr = nextseed >> 17
-        # convert nr to java integer
-        if nr & (1 << 31):
-            nr -= 1 << 32
-        return nr
-
-    # generate 0-9 random
-    r = _next()
-    u = r
+from .utils import get_pos, get_world
+
+_MULTIPLIER = np.uint64(0x5DEECE66D)
+_MASK = np.uint64((1 << 48) - 1)
+# chunks (dx, dz) where slimes can spawn for a player in the middle of chunk (0, 0):
+# between 24 and 128 blocks away (approximated on chunk centers)
+_AFK_OFFSETS = [
+    (dx, dz) for dx in range(-8, 9) for dz in range(-8, 9) if 24 <= 16 * hypot(dx, dz) <= 128
+]
+# ascii and png output
+_NONE, _CHUNK, _SLIME, _MARK = 0, 1, 2, 3
+_CHARS = np.array([" ", ".", "#", "X"])
+_COLORS = np.array([(32, 32, 32), (160, 160, 160), (80, 200, 80), (220, 40, 40)], np.uint8)
+
+
+def _next_int31(state: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """java.util.Random.next(31) on an array of states."""
+    state = (state * _MULTIPLIER + np.uint64(0xB)) & _MASK
+    return state, (state >> np.uint64(17)).astype(np.int64)
+
+
+def slime_chunks(seed: int, xs, zs) -> np.ndarray:
+    """Return a boolean array, True where chunk `(xs, zs)` is a slime chunk.
+
+    `xs` and `zs` are arrays (of any shape) of chunk coordinates,
+    it follows the Java integer arithmetic of the game."""
+    xs = np.asarray(xs, dtype=np.int32)
+    zs = np.asarray(zs, dtype=np.int32)
+    with np.errstate(over="ignore"):
+        # int products overflow as in Java
+        rseed = (
+            np.int64(seed)
+            + (xs * xs * np.int32(0x4C1906)).astype(np.int64)
+            + (xs * np.int32(0x5AC0DB)).astype(np.int64)
+            + (zs * zs).astype(np.int64) * np.int64(0x4307A7)
+            + (zs * np.int32(0x5F24F)).astype(np.int64)
+        ) ^ np.int64(0x3AD8025F)
+    # new Random(rseed).nextInt(10)
+    state = (rseed.view(np.uint64) ^ _MULTIPLIER) & _MASK
+    state, u = _next_int31(state)
     r = u % 10
-    while u - r + 9 < 0:
-        u = _next()
-        r = u % 10
+    # rejected values, in Java `u - r + 9` overflows: it is (almost) never the case
+    retry = u - r + 9 > 0x7FFFFFFF
+    while retry.any():
+        state[retry], u = _next_int31(state[retry])
+        r[retry] = u % 10
+        retry[retry] = u - u % 10 + 9 > 0x7FFFFFFF
     return r == 0
 
 
-def main(save_folder: "minenbt.SaveFolder", dimension, center, distance) -> int:
-    world = get_world(save_folder, dimension)
-    pos = get_pos(save_folder, dimension, center)
+def check_chunk(seed, x, z) -> bool:
+    """Return True if chunk `(x, z)` is a slime chunk."""
+    return bool(slime_chunks(seed, [x], [z])[0])
+
+
+def generated_chunks(
+    world: "minenbt.AnvilFolder", pos: tuple[int, int, int] | None, distance: int | None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return chunk x and z of the generated chunks, reading only the region headers."""
+    xzs = list(world.xzs())
+    if pos and distance:
+        near = set(near_regions(pos[0], pos[2], distance))
+        xzs = [xz for xz in xzs if xz in near]
+    xs, zs = [np.empty(0, np.int64)], [np.empty(0, np.int64)]
+    for rx, rz in xzs:
+        with world.peek(rx, rz) as region:
+            czs, cxs = np.nonzero(region.header["offset"].reshape(32, 32))
+        xs.append(cxs + rx * 32)
+        zs.append(czs + rz * 32)
+    return np.concatenate(xs), np.concatenate(zs)
+
+
+def _grid(xs: np.ndarray, zs: np.ndarray, values: np.ndarray) -> tuple[int, int, np.ndarray]:
+    """Place `values` in a 2D array indexed by [z, x], return x and z of [0, 0] and the array."""
+    x0, z0 = int(xs.min()), int(zs.min())
+    grid = np.zeros((int(zs.max()) - z0 + 1, int(xs.max()) - x0 + 1), np.uint8)
+    grid[zs - z0, xs - x0] = values
+    return x0, z0, grid
+
+
+def _mark(grid: np.ndarray, x: int, z: int) -> None:
+    if 0 <= z < grid.shape[0] and 0 <= x < grid.shape[1]:
+        grid[z, x] = _MARK
+
+
+def best_spot(slime: np.ndarray, margin: int = 0) -> tuple[int, int, int]:
+    """Given a [z, x] grid of slime chunks, return `x, z, count` of the cell
+    with the most slime chunks within 128 blocks.
+
+    Cells within `margin` from the border are counted but not candidates,
+    `x` and `z` are relative to the first candidate."""
+    padded = np.pad(slime.astype(np.uint16), 8)
+    height, width = slime.shape
+    counts = np.zeros(slime.shape, np.uint16)
+    for dx, dz in _AFK_OFFSETS:
+        counts += padded[8 + dz : 8 + dz + height, 8 + dx : 8 + dx + width]
+    counts = counts[margin : height - margin, margin : width - margin]
+    z, x = np.unravel_index(np.argmax(counts), counts.shape)
+    return int(x), int(z), int(counts[z, x])
+
+
+def write_png(path: str | Path, grid: np.ndarray) -> None:
+    """Write a [z, x] grid of `_NONE`, `_CHUNK`, `_SLIME`, `_MARK` as a PNG image."""
+    height, width = grid.shape
+    pixels = _COLORS[grid].reshape(height, width * 3)
+    # every row starts with filter type 0
+    raw = np.concatenate((np.zeros((height, 1), np.uint8), pixels), axis=1).tobytes()
+
+    def png_chunk(tag: bytes, data: bytes) -> bytes:
+        crc = zlib.crc32(tag + data) & 0xFFFFFFFF
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc)
+
+    with open(path, "wb") as png:
+        png.write(b"\x89PNG\r\n\x1a\n")
+        png.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        png.write(png_chunk(b"IDAT", zlib.compress(raw, 9)))
+        png.write(png_chunk(b"IEND", b""))
+
+
+def world_seed(save_folder: "minenbt.SaveFolder") -> int:
     data = save_folder.level_dat().compound["Data"]
-    seed = data["WorldGenSettings"]["seed"]
-    cpos = None
+    if "RandomSeed" in data:
+        # Until MC 1.15.2
+        return data["RandomSeed"].py_int
+    return data["WorldGenSettings"]["seed"].py_int
+
+
+def main(
+    save_folder: "minenbt.SaveFolder",
+    dimension,
+    center,
+    distance,
+    limit=None,
+    area=False,
+    ascii=False,
+    png=None,
+    afk=False,
+) -> int:
+    pos = get_pos(save_folder, dimension, center)
+    seed = world_seed(save_folder)
+    if area:
+        # every chunk around the center, generated or not
+        if not pos or not distance:
+            print("--area requires a center and a distance")
+            return 98
+        r = ceil(distance / 16)
+        zs, xs = np.mgrid[
+            (pos[2] >> 4) - r : (pos[2] >> 4) + r + 1, (pos[0] >> 4) - r : (pos[0] >> 4) + r + 1
+        ]
+        xs, zs = xs.ravel(), zs.ravel()
+    else:
+        world = get_world(save_folder, dimension)
+        xs, zs = generated_chunks(world.regions, pos, distance)
+    distances = None
     if pos:
-        cpos = Coord(x=pos[0], y=0, z=pos[2])
+        distances = np.hypot(xs * 16 - pos[0], zs * 16 - pos[2])
+        if distance:
+            near = distances <= distance
+            xs, zs, distances = xs[near], zs[near], distances[near]
+    if not len(xs):
+        print("\nNo chunks found")
+        return 0
+    slime = slime_chunks(seed, xs, zs)
 
     print("\nChunks founds:")
-    for base_chunk, _ in iterate_chunks(world.regions, pos, distance):
-        if check_chunk(seed, base_chunk.x // 16, base_chunk.z // 16):
-            sdist = ""
-            if cpos:
-                sdist = f" - {base_chunk.distance(cpos):.0f} blocks away"
-            c = {
-                "xa": base_chunk.x - base_chunk.block()[0],
-                "za": base_chunk.z - base_chunk.block()[1],
-            }
-            c["xb"] = c["xa"] + 15
-            c["zb"] = c["za"] + 15
-            print("Found between {xa},{za} and {xb},{zb}{}".format(sdist, **c))
+    order = np.flatnonzero(slime)
+    if distances is not None:
+        order = order[np.argsort(distances[order], kind="stable")]
+    for i in order[:limit].tolist():
+        sdist = ""
+        if distances is not None:
+            sdist = f" - {distances[i]:.0f} blocks away"
+        xa, za = int(xs[i]) * 16, int(zs[i]) * 16
+        print(f"Found between {xa},{za} and {xa + 15},{za + 15}{sdist}")
+
+    x0, z0, grid = _grid(xs, zs, np.where(slime, _SLIME, _CHUNK))
+    if afk:
+        if area:
+            # slime chunks just outside the area count too
+            zz, xx = np.mgrid[z0 - 8 : z0 + grid.shape[0] + 8, x0 - 8 : x0 + grid.shape[1] + 8]
+            x, z, count = best_spot(slime_chunks(seed, xx, zz), margin=8)
+        else:
+            x, z, count = best_spot(grid == _SLIME)
+        print(f"\nBest AFK spot: {(x + x0) * 16 + 8},{(z + z0) * 16 + 8}", end="")
+        print(f" with {count} slime chunks within 128 blocks")
+        _mark(grid, x, z)
+    elif pos:
+        _mark(grid, (pos[0] >> 4) - x0, (pos[2] >> 4) - z0)
+    if ascii:
+        print(f"\nMap from chunk {x0},{z0} (x to the right, z downwards):")
+        for row in _CHARS[grid]:
+            print("".join(row))
+    if png:
+        write_png(png, grid)
+        print(f"\nMap saved to {png}, one pixel per chunk from chunk {x0},{z0}")
     return 0
@@ -6,11 +6,45 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     import minenbt
+    from minenbt.utils import Coord
 
-from .utils import get_pos, get_world, iterate_chunks
+from .utils import chunk_filter, get_pos, get_world, scan_chunks
 
+# tags read by chunk_structures
+PATHS = ("structures",)
 
-def main(save_folder: "minenbt.SaveFolder", dimension, center, distance) -> int:
+
+def chunk_structures(
+    base_chunk: "Coord", chunk: "minenbt.Chunk"
+) -> list[tuple[str, int, int | str, int]] | None:
+    """Return `name, x, y, z` of every structure referenced or started in the chunk."""
+    structures: list[tuple[str, int, int | str, int]] = []
+    for k, v in chunk["structures"]["References"].items():
+        if not len(v):
+            continue
+        x = v[0] % 32
+        z = v[0] >> 32
+        structures.append((k, base_chunk.x + x, "?", base_chunk.z + z))
+    for k, v in chunk["structures"]["starts"].items():
+        if v["id"].py_str == "INVALID":
+            continue
+        x, y, z = v["Children"][0]["BB"].np_array.tolist()[0:3]
+        # x = int((bb[0] + bb[3]) / 2)
+        # y = int((bb[1] + bb[4]) / 2)
+        # z = int((bb[2] + bb[5]) / 2)
+        structures.append((k, x, y, z))
+    return structures or None
+
+
+def main(
+    save_folder: "minenbt.SaveFolder",
+    dimension,
+    center,
+    distance,
+    jobs=1,
+    min_inhabited=None,
+    status=None,
+) -> int:
     world = get_world(save_folder, dimension)
     pos = get_pos(save_folder, dimension, center)
     seen: dict[str, list[tuple[int, int]]] = {}
@@ -28,19 +62,10 @@ def main(save_folder: "minenbt.SaveFolder", dimension, center, distance) -> int:
         seen[name].append((x, z))
 
     print("Structures:\n")
-    for base_chunk, chunk in iterate_chunks(world.regions, pos, distance):
-        for k, v in chunk["structures"]["References"].items():
-            if not len(v):
-                continue
-            x = v[0] % 32
-            z = v[0] >> 32
-            print_if_new(k, base_chunk.x + x, "?", base_chunk.z + z)
-        for k, v in chunk["structures"]["starts"].items():
-            if v["id"].py_str == "INVALID":
-                continue
-            x, y, z = v["Children"][0]["BB"].np_array.tolist()[0:3]
-            # x = int((bb[0] + bb[3]) / 2)
-            # y = int((bb[1] + bb[4]) / 2)
-            # z = int((bb[2] + bb[5]) / 2)
-            print_if_new(k, x, y, z)
+    cfilter = chunk_filter(min_inhabited, status)
+    for _, structures in scan_chunks(
+        world.regions, chunk_structures, pos, distance, jobs, paths=PATHS, chunk_filter=cfilter
+    ):
+        for name, x, y, z in structures:
+            print_if_new(name, x, y, z)
     return 0
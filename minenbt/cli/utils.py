@@ -3,16 +3,18 @@ import json
 from pathlib import Path
 from shutil import move
 from sys import exit
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Callable
 
 from amulet_nbt import AbstractBaseTag
 from numpy import ndarray
 
-from minenbt.file_formats import NbtFile
-from minenbt.utils import Coord, near_chunks, parse_uuid
+from minenbt.file_formats import ChunkFilter, NbtFile
+from minenbt.index import EntityIndex, ScanCache
+from minenbt.scan import map_chunks
+from minenbt.utils import Coord, parse_uuid
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Iterable, Iterator
 
     from amulet_nbt import CompoundTag
 
@@ -20,6 +22,12 @@ if TYPE_CHECKING:
 
 __all__ = [
     "iterate_chunks",
+    "scan_chunks",
+    "scan_cache",
+    "progress_printer",
+    "update_entity_index",
+    "index_rows",
+    "chunk_filter",
     "get_world",
     "center",
     "get_pos",
@@ -32,6 +40,9 @@ __all__ = [
     "json_pprint"
 ]
 
+# max horizontal distance between the origin of a chunk and any of its blocks
+_CHUNK_DIAGONAL = 23
+
 
 def center(s: str) -> Coord:
     try:
@@ -62,25 +73,104 @@ def dimension_player(save_folder: "SaveFolder") -> str | None:
 
 
 def iterate_chunks(
-    world: "AnvilFolder", center: tuple[int, int, int] | None, distance: int | None
+    world: "AnvilFolder",
+    center: tuple[int, int, int] | None,
+    distance: int | None,
+    paths: "Iterable[str] | None" = None,
+    chunk_filter: "ChunkFilter | None" = None,
 ) -> "Iterator[tuple[Coord, Chunk]]":
-    chunk = None  # type: None | Chunk
     if not distance or not center:
-        for rx, rz, region in world.all():
-            for cx, cz, chunk in region.chunks():
-                yield Coord.compose((rx, rz), (cx, cz)), chunk
+        for rx, rz, region in world.all(stream=True):
+            chunks = region.read_chunks(
+                region.xzs(), cache=False, paths=paths, chunk_filter=chunk_filter, bulk=True
+            )
+            for cx, cz in region.xzs():
+                if chunks[cx, cz]:
+                    yield Coord.compose((rx, rz), (cx, cz)), chunks[cx, cz]
     else:
-        for coord in near_chunks(center[0], center[2], distance):
-            try:
-                chunk = world.single(*coord.region()).chunk(*coord.chunk())
-                if chunk:
-                    yield coord, chunk
-            except KeyError:
-                pass
+        yield from world.near_chunks(center[0], center[2], distance, paths, chunk_filter)
+
+
+def scan_chunks(
+    world: "AnvilFolder",
+    func: "Callable[[Coord, Chunk], Any]",
+    center: tuple[int, int, int] | None,
+    distance: int | None,
+    jobs: int | None = 1,
+    cache: "ScanCache | None" = None,
+    paths: "Iterable[str] | None" = None,
+    chunk_filter: "ChunkFilter | None" = None,
+) -> "Iterator[tuple[Coord, Any]]":
+    """Call `func(coord, chunk)` on every chunk, yield `coord, result` when result is not None.
+
+    With `jobs` = 1 chunks are read by `iterate_chunks`, nearest first if a distance is given,
+    otherwise regions are split across `jobs` processes (0 = one per CPU).
+    With `cache` only the chunks changed since the last scan are read (see `map_chunks`).
+    With `paths` only those tags of the chunks are decoded,
+    with `chunk_filter` only the accepted chunks are passed to `func`."""
+    if jobs == 1 and cache is None:
+        for coord, chunk in iterate_chunks(world, center, distance, paths, chunk_filter):
+            result = func(coord, chunk)
+            if result is not None:
+                yield coord, result
+        return
+    if not distance:
+        center = None
+    yield from map_chunks(
+        world, func, jobs, center, distance, cache=cache, paths=paths, chunk_filter=chunk_filter
+    )
+
+
+def chunk_filter(min_inhabited: int | None, status: list[str] | None) -> ChunkFilter | None:
+    """Return the filter for the `--min-inhabited` and `--status` options, if any."""
+    if min_inhabited is None and not status:
+        return None
+    return ChunkFilter(
+        status=tuple(sorted(status)) if status else None, min_inhabited=min_inhabited
+    )
+
+
+def scan_cache(world: "Dimension", scan: str, incremental: bool) -> "ScanCache | None":
+    """Return the cache for `scan` results if `incremental`, else None."""
+    if not incremental:
+        return None
+    return ScanCache(world, scan)
+
+
+def progress_printer(label: str) -> Callable[[int, int], None]:
+    """Return a `progress(done, total)` callback that prints `label... done/total` in place."""
+
+    def progress(i: int, lregions: int) -> None:
+        print(f"{label}... {i:0>3}/{lregions}", end="\r")
+
+    return progress
+
+
+def update_entity_index(world: "Dimension") -> EntityIndex:
+    """Return the entity index of `world`, updated."""
+    entity_index = EntityIndex(world)
+    entity_index.update(progress_printer("Updating entity index"))
+    return entity_index
+
+
+def index_rows(
+    entity_index: EntityIndex, center: tuple[int, int, int] | None, distance: int | None, flags=0
+) -> ndarray:
+    """Return the rows of the entity index with any of `flags`,
+    in the chunks that `scan_chunks` would read (see `iterate_chunks`)."""
+    if not distance or not center:
+        return entity_index.of_type(flags=flags)
+    x, _, z = center
+    # the chunks whose origin is within the distance, as `near_chunks`
+    rows = entity_index.radius(x, None, z, distance + _CHUNK_DIAGONAL, flags=flags)
+    chunks = entity_index.chunk[rows].astype(float)
+    origins_x = chunks[:, 0] * 512 + chunks[:, 2] * 16
+    origins_z = chunks[:, 1] * 512 + chunks[:, 3] * 16
+    return rows[(origins_x - x) ** 2 + (origins_z - z) ** 2 <= distance**2]
 
 
-    """save folder + dimension name -> World"""
 def get_world(save_folder: "SaveFolder", dimension: str | None) -> "Dimension":
+    """save folder + dimension name -> World"""
     if not dimension:
         dimension = dimension_player(save_folder)
         if dimension:
@@ -0,0 +1,157 @@
+"""Decompressors (and compressors) of the chunks stored in region files, by compression type.
+
+https://minecraft.fandom.com/Region_file_format#Chunk_data
+
+The fastest available implementation is chosen at import time:
+`isal` or `zlib-ng` for gzip and zlib, `lz4` for LZ4, when installed.
+Other compression types can be added with `register`.
+LZ4 chunks can be read but not written, `compressor` tells which type to use instead."""
+import gzip
+import zlib
+from typing import Callable, Union
+
+try:
+    from isal import isal_zlib as _zlib
+except ImportError:
+    try:
+        from zlib_ng import zlib_ng as _zlib
+    except ImportError:
+        _zlib = zlib
+
+try:
+    from lz4 import block as _lz4_block
+except ImportError:
+    _lz4_block = None
+
+__all__ = [
+    "GZIP",
+    "ZLIB",
+    "NONE",
+    "LZ4",
+    "EXTERNAL",
+    "register",
+    "decompress",
+    "compressor",
+    "compress",
+]
+
+GZIP = 1
+ZLIB = 2
+NONE = 3
+LZ4 = 4
+# flag of the chunks stored in their own c.X.Z.mcc file
+EXTERNAL = 128
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+_DECOMPRESSORS: dict[int, Callable[[Buffer], bytes]] = {}
+_COMPRESSORS: dict[int, Callable[[bytes], bytes]] = {}
+
+
+def register(
+    compression: int,
+    decompressor: Callable[[Buffer], bytes],
+    compressor: Callable[[bytes], bytes] | None = None,
+) -> None:
+    """Use `decompressor(payload) -> data` for the chunks with `compression` type,
+    and `compressor(data) -> payload` to write them, if provided."""
+    _DECOMPRESSORS[compression] = decompressor
+    if compressor is not None:
+        _COMPRESSORS[compression] = compressor
+
+
+def decompress(compression: int, payload: Buffer) -> bytes:
+    """Return the NBT data of a chunk from its `payload`, compressed with `compression`."""
+    if compression not in _DECOMPRESSORS:
+        raise NotImplementedError(f"Compression = {compression}")
+    return _DECOMPRESSORS[compression](payload)
+
+
+def compressor(compression: int) -> int:
+    """Return `compression` if chunks can be written with it, otherwise zlib."""
+    return compression if compression in _COMPRESSORS else ZLIB
+
+
+def compress(compression: int, data: bytes) -> bytes:
+    """Return the payload of a chunk from its NBT `data`, compressed with `compression`."""
+    if compression not in _COMPRESSORS:
+        raise NotImplementedError(f"Compression = {compression}")
+    return _COMPRESSORS[compression](data)
+
+
+def _lz4_python(block: Buffer, size: int) -> bytes:
+    """Decompress a LZ4 block of `size` bytes, without the `lz4` library."""
+    out = bytearray()
+    pos = 0
+    while pos < len(block):
+        token = block[pos]
+        pos += 1
+        literals = token >> 4
+        if literals == 15:
+            while True:
+                literals += block[pos]
+                pos += 1
+                if block[pos - 1] != 255:
+                    break
+        out += block[pos : pos + literals]
+        pos += literals
+        if pos >= len(block):
+            # the last sequence has only literals
+            break
+        offset = block[pos] | block[pos + 1] << 8
+        pos += 2
+        length = token & 15
+        if length == 15:
+            while True:
+                length += block[pos]
+                pos += 1
+                if block[pos - 1] != 255:
+                    break
+        length += 4
+        start = len(out) - offset
+        if offset >= length:
+            out += out[start : start + length]
+        else:
+            # overlapping copy, the match repeats the last `offset` bytes
+            out += (out[start:] * (length // offset + 1))[:length]
+    if len(out) != size:
+        raise ValueError(f"LZ4 block decompressed to {len(out)} bytes, expected {size}")
+    return bytes(out)
+
+
+def _lz4_blocks(payload: Buffer) -> bytes:
+    """Decompress a LZ4 stream, as written by lz4-java `LZ4BlockOutputStream`.
+
+    Every block has a 21 bytes header: `LZ4Block` magic, a token (method and level),
+    compressed size, decompressed size and checksum (little endian, not verified)."""
+    data = bytearray()
+    payload = memoryview(payload)
+    pos = 0
+    while pos + 21 <= len(payload):
+        if payload[pos : pos + 8] != b"LZ4Block":
+            raise ValueError(f"Invalid LZ4 block at {pos}")
+        method = payload[pos + 8] & 0xF0
+        compressed = int.from_bytes(payload[pos + 9 : pos + 13], "little")
+        size = int.from_bytes(payload[pos + 13 : pos + 17], "little")
+        pos += 21
+        block = payload[pos : pos + compressed]
+        pos += compressed
+        if size == 0:
+            # end of stream
+            break
+        if method == 0x10:
+            data += block
+        elif method == 0x20:
+            if _lz4_block is not None:
+                data += _lz4_block.decompress(block, uncompressed_size=size)
+            else:
+                data += _lz4_python(block, size)
+        else:
+            raise ValueError(f"Unknown LZ4 block method {method:#x}")
+    return bytes(data)
+
+
+register(GZIP, lambda payload: _zlib.decompress(payload, 31), gzip.compress)
+register(ZLIB, _zlib.decompress, _zlib.compress)
+register(NONE, bytes, bytes)
+register(LZ4, _lz4_blocks)
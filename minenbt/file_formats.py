@@ -1,23 +1,55 @@
 """Provides interfaces to handle specific Minecraft File"""
-import zlib
+import mmap
+import sys
+import time
 from collections import namedtuple
+from fnmatch import fnmatchcase
 from math import ceil
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, NamedTuple
 
 import amulet_nbt
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
-    from io import BufferedReader
+    from collections.abc import Iterable, Iterator, Mapping
 
     from amulet_nbt._dtype import AnyNBT
 
+    from .nbt import Paths
+
 import numpy
-from amulet_nbt import CompoundTag
+from amulet_nbt import CompoundTag, ListTag, LongArrayTag, StringTag
 from amulet_nbt import load as load_nbt
 
-__all__ = ["AnvilFile", "NbtFile", "Chunk"]
+from .compression import EXTERNAL, ZLIB, compress, compressor, decompress
+from .nbt import parse_paths, project, values
+from .utils import Coord, Interner, pack_longs, unpack_longs
+
+__all__ = [
+    "AnvilFile",
+    "NbtFile",
+    "Chunk",
+    "ChunkFilter",
+    "BIOME_IDS",
+    "BLOCK_IDS",
+    "BLOCK_STATES",
+    "block_state",
+]
+
+# biome and block ids found in sections, shared by every chunk
+BIOME_IDS = Interner("biomes")
+BLOCK_IDS = Interner("blocks")
+# blocks with their properties (see `block_state`)
+BLOCK_STATES = Interner("block_states")
+
+
+def block_state(entry: CompoundTag) -> str:
+    """Return a palette entry as a string, es: `minecraft:oak_log[axis=y]`."""
+    name = entry["Name"].py_str
+    if "Properties" not in entry or not len(entry["Properties"]):
+        return name
+    properties = sorted((k, v.py_str) for k, v in entry["Properties"].items())
+    return name + "[" + ",".join(f"{k}={v}" for k, v in properties) + "]"
 
 
 class NbtFile:
@@ -32,7 +64,13 @@ class NbtFile:
     def compound(self) -> CompoundTag:
         return self.tag.compound
 
-class _Metadata(namedtuple("_Metadata", ("offset", "timestamp"))):
+
+_HEADER_DTYPE = numpy.dtype(
+    [("offset", numpy.uint32), ("sectors", numpy.uint8), ("timestamp", numpy.uint32)]
+)
+
+
+class _Metadata(namedtuple("_Metadata", ("offset", "sectors", "timestamp"))):
     """A chunk metadata"""
 
     __slots__ = ()
@@ -48,19 +86,37 @@ class _Metadata(namedtuple("_Metadata", ("offset", "timestamp"))):
 
 
 class Section(CompoundTag):
-    """A 16×16×16 section of the chuck for DataVersion < 2529."""
+    """A 16×16×16 section of the chuck for DataVersion < 2529.
+
+    Block states are kept as a (y, z, x) array of palette indexes:
+    `uint8` when the palette has up to 256 entries, `uint16` otherwise.
+    Once decoded a section costs 4 KiB (8 KiB for big palettes) for the states,
+    plus the packed `block_states.data` kept by the NBT tag (2-8 KiB).
+
+    Blocks can be changed with `set_block`, `fill` and `replace`: only the array is updated,
+    then `flush` compacts the palette and packs the states back into the NBT tags.
+
+    Biomes are stored for 4×4×4 cells, they are decoded on first access (see `biomes`)."""
 
     def __init__(self, compound) -> None:
         super().__init__(dict(compound))
-        self._states: numpy.array | None = None
+        self._states: numpy.ndarray | None = None
         self._palette: tuple[str] | None = None
-        if (
-            "block_states" not in self
-            or "palette" not in self["block_states"]
-            or "data" not in self["block_states"]
-        ):
+        self._biomes: tuple[tuple[str], numpy.ndarray] | None = None
+        # palette entries (compounds), only after a change
+        self._entries: list[CompoundTag] | None = None
+        self.dirty = False
+        if "block_states" not in self or "palette" not in self["block_states"]:
+            return
+        # the same ids are found in every section, keep a single copy of them
+        self._palette = tuple(
+            sys.intern(p["Name"].py_str) for p in self["block_states"]["palette"]
+        )
+        dtype = numpy.uint8 if len(self._palette) <= 256 else numpy.uint16
+        if "data" not in self["block_states"]:
+            # single-entry palette, every block is the same
+            self._states = numpy.zeros((16, 16, 16), dtype=dtype)
             return
-        self._palette = tuple(p["Name"].py_str for p in self["block_states"]["palette"])
         nbit = max((len(self._palette) - 1).bit_length(), 4)
         if len(self["block_states"]["data"]) != ceil(16 * 16 * 16 / (64 // nbit)):
             raise ValueError(
@@ -68,38 +124,214 @@ class Section(CompoundTag):
                     len(self["block_states"]["data"]), len(self._palette)
                 )
             )
-        unused = 64 % nbit
-        blength = 64 - unused
-        mask = pow(2, nbit) - 1
-        states = []
-        for longstate in self["block_states"]["data"].np_array:
-            for _i in range(0, blength, nbit):
-                states.append(longstate & mask)
-                longstate = longstate >> nbit
-        self._states = numpy.reshape(states[: 16 * 16 * 16], [16, 16, 16]).tolist()
+        states = unpack_longs(self["block_states"]["data"].np_array, nbit, 16 * 16 * 16, dtype)
+        self._states = states.reshape(16, 16, 16)
+
+    def states(self) -> "tuple[tuple[str], numpy.ndarray] | None":
+        """Return the block palette and the (y, z, x) 16×16×16 array of palette indexes.
+
+        `None` if the section has no blocks."""
+        if self._palette is None or self._states is None:
+            return None
+        return self._palette, self._states
+
+    def global_ids(self, properties=False) -> "numpy.ndarray | None":
+        """Return the blocks as a (y, z, x) array of `BLOCK_IDS` ids,
+        or of `BLOCK_STATES` ids with `properties` (see `block_state`).
+
+        Only the palette is looked up, the array is built with a single NumPy indexing."""
+        if self._palette is None or self._states is None:
+            return None
+        if properties:
+            entries = self._entries or self["block_states"]["palette"]
+            lut = BLOCK_STATES.ids(block_state(e) for e in entries)
+        else:
+            lut = BLOCK_IDS.ids(self._palette)
+        return lut[self._states]
 
     def block(self, x, y, z) -> str | None:
         if not self._palette or self._states is None:
             return None
-        return self._palette[self._states[y][z][x]]
+        return self._palette[self._states[y, z, x]]
 
     def blocks(self) -> "Iterator[tuple[tuple[int, int, int], str]]":
-        if self._palette:
-            for (y, z, x), state in numpy.ndenumerate(self._states):
-                yield (x, y, z), self._palette[state]
+        if not self._palette or self._states is None:
+            return
+        ys, zs, xs = numpy.indices(self._states.shape).reshape(3, -1).tolist()
+        for x, y, z, state in zip(xs, ys, zs, self._states.reshape(-1).tolist()):
+            yield (x, y, z), self._palette[state]
 
     def blocks_available(self) -> set[str]:
         if not self._palette:
             return set()
         return set([n for n in self._palette])
 
+    def palette_indexes(self, block_ids: "Iterable[str]") -> list[int]:
+        """Return the palette indexes of the blocks matching any of `block_ids`.
+
+        `block_ids` can contain glob patterns, like `minecraft:*_ore`."""
+        if not self._palette:
+            return []
+        block_ids = tuple(block_ids)
+        return [
+            i
+            for i, name in enumerate(self._palette)
+            if any(fnmatchcase(name, b) for b in block_ids)
+        ]
+
+    def query(
+        self,
+        block_ids: "Iterable[str]",
+        origin: tuple[int, int] = (0, 0),
+        center: Coord | None = None,
+    ) -> "tuple[numpy.ndarray, list[str], numpy.ndarray | None]":
+        """Find every block matching `block_ids` (ids or glob patterns).
+
+        `origin` is the world `x, z` of the chunk containing the section.
+        Returns the world coordinates of the blocks as a `n×3` array (x, y, z),
+        their ids and, if `center` is provided, their distances from `center`."""
+        indexes = self.palette_indexes(block_ids)
+        coords = numpy.empty((0, 3), dtype=numpy.int64)
+        names: list[str] = []
+        if indexes and self._palette and self._states is not None:
+            ys, zs, xs = numpy.nonzero(numpy.isin(self._states, indexes))
+            names = [self._palette[s] for s in self._states[ys, zs, xs].tolist()]
+            coords = numpy.stack(
+                (xs + origin[0], ys + self["Y"].py_int * 16, zs + origin[1]), axis=1
+            ).astype(numpy.int64)
+        distances = None
+        if center is not None:
+            distances = numpy.sqrt(((coords - numpy.array(center)) ** 2).sum(axis=1))
+        return coords, names, distances
+
     def find_block(self, x, y, z) -> str | None:
         if not self._palette or self._states is None:
             return None
-        x = x & 15
-        y = y & 15
-        z = z & 15
-        return self._palette[self._states[y][z][x]]
+        return self._palette[self._states[y & 15, z & 15, x & 15]]
+
+    def __index(self, block: "str | CompoundTag") -> int:
+        """Return the palette index of `block` (an id or a palette entry), add it if missing.
+
+        An id matches only an entry without `Properties` (es: not `oak_log[axis=x]`)."""
+        if self._palette is None or self._states is None:
+            # a section without blocks is full of air
+            self._palette = ("minecraft:air",)
+            self._entries = [CompoundTag({"Name": StringTag("minecraft:air")})]
+            self._states = numpy.zeros((16, 16, 16), dtype=numpy.uint8)
+        if self._entries is None:
+            self._entries = list(self["block_states"]["palette"])
+        if isinstance(block, str):
+            for i, e in enumerate(self._entries):
+                if self._palette[i] == block and not len(e.get("Properties", ())):
+                    return i
+            entry = CompoundTag({"Name": StringTag(block)})
+        else:
+            for i, e in enumerate(self._entries):
+                if e == block:
+                    return i
+            entry = block
+        self._entries.append(entry)
+        self._palette += (entry["Name"].py_str,)
+        if len(self._palette) > 256 and self._states.dtype == numpy.uint8:
+            self._states = self._states.astype(numpy.uint16)
+        return len(self._palette) - 1
+
+    def set_block(self, x, y, z, block: "str | CompoundTag") -> None:
+        """Set the block at `x, y, z` (within the section) to `block`, an id or a palette entry."""
+        self.fill(block, (y & 15, z & 15, x & 15))
+
+    def fill(self, block: "str | CompoundTag", where=None) -> None:
+        """Set the blocks selected by `where` to `block` (an id or a palette entry).
+
+        `where` indexes the (y, z, x) states: a boolean mask, a tuple of indexes or slices.
+        `None` selects the whole section."""
+        index = self.__index(block)
+        if where is None:
+            self._states[...] = index
+        else:
+            self._states[where] = index
+        self.dirty = True
+
+    def replace(self, block_ids: "Iterable[str]", block: "str | CompoundTag", mask=None) -> int:
+        """Replace the blocks matching `block_ids` (ids or glob patterns) with `block`.
+
+        `mask` is a boolean (y, z, x) array limiting the replacement.
+        Returns how many blocks are replaced."""
+        indexes = self.palette_indexes(block_ids)
+        if not indexes or self._states is None:
+            return 0
+        selected = numpy.isin(self._states, indexes)
+        if mask is not None:
+            selected &= mask
+        count = int(numpy.count_nonzero(selected))
+        if count:
+            self.fill(block, selected)
+        return count
+
+    def flush(self) -> bool:
+        """Write the changed blocks back to `block_states`, returns False if nothing changed.
+
+        Unused palette entries are dropped, the states are packed with the fewest bits
+        needed by the palette (at least 4)."""
+        if not self.dirty or self._states is None:
+            return False
+        entries = self._entries or list(self["block_states"]["palette"])
+        used, states = numpy.unique(self._states, return_inverse=True)
+        used = used.tolist()
+        self._entries = [entries[i] for i in used]
+        self._palette = tuple(self._palette[i] for i in used)
+        dtype = numpy.uint8 if len(self._palette) <= 256 else numpy.uint16
+        self._states = states.reshape(16, 16, 16).astype(dtype)
+        block_states = self["block_states"] if "block_states" in self else CompoundTag()
+        block_states["palette"] = ListTag(self._entries)
+        if len(self._entries) == 1:
+            if "data" in block_states:
+                del block_states["data"]
+        else:
+            nbit = max((len(self._entries) - 1).bit_length(), 4)
+            block_states["data"] = LongArrayTag(pack_longs(self._states, nbit))
+        self["block_states"] = block_states
+        self.dirty = False
+        return True
+
+    def biomes(self) -> "tuple[tuple[str], numpy.ndarray] | None":
+        """Return the biome palette and a (y, z, x) 4×4×4 array of palette indexes.
+
+        Every cell is 4×4×4 blocks, `None` if the section has no biomes."""
+        if self._biomes is None:
+            if "biomes" not in self or "palette" not in self["biomes"]:
+                return None
+            palette = tuple(p.py_str for p in self["biomes"]["palette"])
+            if "data" not in self["biomes"]:
+                # single-entry palette, every cell is the same
+                cells = numpy.zeros((4, 4, 4), dtype=numpy.uint8)
+            else:
+                nbit = (len(palette) - 1).bit_length()
+                if len(self["biomes"]["data"]) != ceil(4 * 4 * 4 / (64 // nbit)):
+                    raise ValueError(
+                        "There are {} 64-bit fields for {} biomes".format(
+                            len(self["biomes"]["data"]), len(palette)
+                        )
+                    )
+                cells = unpack_longs(self["biomes"]["data"].np_array, nbit, 4 * 4 * 4, numpy.uint8)
+                cells = cells.reshape(4, 4, 4)
+            self._biomes = palette, cells
+        return self._biomes
+
+    def biome_ids(self) -> "numpy.ndarray | None":
+        """Return the biomes of the 4×4×4 cells as `BIOME_IDS` ids, (y, z, x) ordered."""
+        biomes = self.biomes()
+        if biomes is None:
+            return None
+        palette, cells = biomes
+        return BIOME_IDS.ids(palette)[cells]
+
+    def find_biome(self, x, y, z) -> str | None:
+        biomes = self.biomes()
+        if biomes is None:
+            return None
+        palette, cells = biomes
+        return palette[cells[(y & 15) >> 2, (z & 15) >> 2, (x & 15) >> 2]]
 
     @property
     def py_dict(self) -> "dict[str, AnyNBT | dict[str, str]]":
@@ -111,25 +343,129 @@ class Section(CompoundTag):
 class Chunk(CompoundTag):
     """Chunks store the terrain and entities within a 16×384×16 area.
 
+    Sections are decoded on first access and cached, the cache is flushed and dropped
+    when a key of the chunk is set or deleted (see `invalidate`).
+    Then the chunk is `dirty`: `AnvilFile.save` will write it back.
+
     https://minecraft.fandom.com/Chunk_format"""
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._sections: dict[int, Section | None] = {}
+        self.dirty = False
+
+    def __setitem__(self, key, value) -> None:
+        # before the change, the cached sections may belong to the replaced tag
+        self.invalidate()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key) -> None:
+        self.invalidate()
+        super().__delitem__(key)
+
+    def invalidate(self) -> None:
+        """Drop the cached sections and mark the chunk as modified,
+        call it after editing nested tags of the chunk.
+
+        The blocks changed in the cached sections are written back first (see `flush`)."""
+        self.flush()
+        self._sections = {}
+        self.dirty = True
+
     def section(self, i: int) -> Section | None:
         """Return a vertical section of the chunk, if available"""
-        if self["DataVersion"].py_int >= 2529:
+        if i not in self._sections:
+            if self["DataVersion"].py_int < 2529:
+                raise ValueError("DataVersion {} not supported".format(self["DataVersion"]))
             # https://minecraft.fandom.com/Java_Edition_20w17a
-            return Section(self["sections"][i + 1])
-        raise ValueError("DataVersion {} not supported".format(self["DataVersion"]))
+            section = None
+            if 0 <= i + 1 < len(self["sections"]):
+                section = Section(self["sections"][i + 1])
+            self._sections[i] = section
+        return self._sections[i]
 
     def sections(self) -> "Iterator[Section]":
-        """Iterate all sections in the chunk"""
-        for i in range(len(self["sections"]) - 1):
+        """Iterate all sections in the chunk, use their `Y` tag to place them.
+
+        Every entry of `sections` is returned, also the first one:
+        it's not always a light-only section below the world."""
+        for i in range(-1, len(self["sections"]) - 1):
             section = self.section(i)
             if section:
                 yield section
 
+    def flush(self) -> int:
+        """Write back the blocks of the changed sections (see `Section.flush`).
+
+        Returns the number of sections written, the chunk is `dirty` if any."""
+        flushed = 0
+        for i, section in self._sections.items():
+            if section is not None and section.flush():
+                self["sections"][i + 1]["block_states"] = section["block_states"]
+                flushed += 1
+        if flushed:
+            self.dirty = True
+        return flushed
+
+    def section_at(self, sy: int) -> Section | None:
+        """Return the section with the given `Y` (block y >> 4), if available"""
+        for i, section in enumerate(self["sections"]):
+            if section["Y"].py_int == sy:
+                return self.section(i - 1)
+        return None
+
     def find_section(self, y: int) -> Section | None:
         """Return the section with given y, if available"""
-        return self.section((y >> 4) + 3)
+        return self.section_at(y >> 4)
+
+
+class ChunkFilter(NamedTuple):
+    """Accept only some chunks, by their top-level tags.
+
+    The tags are read before decoding the rest of the chunk (see `minenbt.nbt.values`).
+    `status` are the accepted generation statuses (es: `full`, namespace not required),
+    `min_inhabited` is the minimum time spent by players in the chunk, in ticks (20 = 1 s)."""
+
+    status: tuple[str, ...] | None = None
+    min_inhabited: int | None = None
+    min_last_update: int | None = None
+    min_data_version: int | None = None
+
+    def tags(self) -> list[str]:
+        """Return the names of the tags needed by the filter."""
+        tags = []
+        if self.status is not None:
+            tags.append("Status")
+        for tag, minimum in self.__minimums():
+            if minimum is not None:
+                tags.append(tag)
+        return tags
+
+    def __minimums(self) -> list[tuple[str, int | None]]:
+        return [
+            ("InhabitedTime", self.min_inhabited),
+            ("LastUpdate", self.min_last_update),
+            ("DataVersion", self.min_data_version),
+        ]
+
+    def match(self, tags: "Mapping[str, Any]") -> bool:
+        """Return True if the chunk with these top-level `tags` is accepted."""
+        if self.status is not None:
+            status = str(tags.get("Status", "")).split(":")[-1]
+            if status not in {s.split(":")[-1] for s in self.status}:
+                return False
+        for tag, minimum in self.__minimums():
+            if minimum is not None and tags.get(tag, 0) < minimum:
+                return False
+        return True
+
+    def match_chunk(self, chunk: "Chunk") -> bool:
+        """Like `match`, for an already decoded chunk."""
+        tags = {}
+        for tag in self.tags():
+            if tag in chunk:
+                tags[tag] = chunk[tag].py_str if tag == "Status" else chunk[tag].py_int
+        return self.match(tags)
 
 
 class AnvilFile:
@@ -138,7 +474,12 @@ class AnvilFile:
     in which groups of 32×32 chunks are stored.
 
     It's inizialized with only the chunk metadata,
-    if a chunk is read, the whole file is parsed."""
+    every chunk is decoded only when requested and then kept in memory.
+    Use `read_all` (or `chunks`) to decode the whole file with a single sequential read.
+
+    The file is memory mapped while in use, call `close` to release it.
+
+    Modified chunks (see `Chunk.dirty`) are written back by `save`."""
 
     def __init__(self, filepath: str | Path, byteorder="big") -> None:
         self.byteorder = byteorder
@@ -147,8 +488,13 @@ class AnvilFile:
             raise ValueError(f"Path {filepath} does not exists")
         if not self._filepath.is_file():
             raise ValueError(f"Path {filepath} is not a file")
+        self.__mmap: mmap.mmap | None = None
+        self.__view: memoryview | None = None
         self.__init_metadata()
         self.__chunks: dict[tuple[int, int], Chunk | None] = {}
+        # compression type of the decoded chunks, used to write them back
+        self.__compressions: dict[tuple[int, int], int] = {}
+        self.__nbytes = 0
 
     def __str__(self) -> str:
         return f"Anvil({self._filepath.name!r})"
@@ -156,58 +502,278 @@ class AnvilFile:
     def __repr__(self) -> str:
         return f"Anvil('{self._filepath.absolute()}', {self.byteorder!r})"
 
-    def __read_int_from_bytes(self, mcafile: "BufferedReader", size):
-        return int.from_bytes(mcafile.read(size), self.byteorder)
+    def __open(self) -> memoryview:
+        if self.__view is None:
+            with open(self._filepath.absolute(), "rb") as mcafile:
+                if self._filepath.stat().st_size:
+                    self.__mmap = mmap.mmap(mcafile.fileno(), 0, access=mmap.ACCESS_READ)
+                    self.__view = memoryview(self.__mmap)
+                else:
+                    # an empty file cannot be mapped
+                    self.__view = memoryview(b"")
+        return self.__view
+
+    def __advise(self, option_name: str) -> None:
+        # madvise and its options are not available on every platform
+        if self.__mmap is not None and hasattr(mmap, option_name):
+            self.__mmap.madvise(getattr(mmap, option_name))
+
+    def close(self) -> None:
+        """Release the memory map of the file, it will be mapped again when needed."""
+        if self.__view is not None:
+            self.__view.release()
+        if self.__mmap is not None:
+            self.__mmap.close()
+        self.__view = None
+        self.__mmap = None
 
     def __init_metadata(self) -> None:
-        metadatas = {}
+        # a single read, listing chunks does not need the memory map
         with open(self._filepath.absolute(), "rb") as mcafile:
-            offsets = []
-            for _i in range(1024):
-                offsets.append(self.__read_int_from_bytes(mcafile, 3))
-                # sector_count = read_numeric(BYTE, mcafile, self.byteorder)
-                mcafile.seek(1, 1)  # skip sector count
-            for i in range(1024):
-                x = i % 32
-                z = i // 32
-                metadatas[x, z] = _Metadata(offsets[i], self.__read_int_from_bytes(mcafile, 4))
-        self._metadatas = metadatas
-
-    def __read_chunks(self) -> None:
-        if self.__chunks:
+            # missing bytes (a truncated header) are read as 0
+            header = mcafile.read(8192).ljust(8192, b"\0")
+        dtype = (">" if self.byteorder == "big" else "<") + "u4"
+        # 3 bytes offset, then 1 byte sector count
+        locations = numpy.frombuffer(header, dtype=dtype, count=1024)
+        self._header = numpy.zeros(1024, dtype=_HEADER_DTYPE)
+        if self.byteorder == "big":
+            self._header["offset"] = locations >> 8
+            self._header["sectors"] = locations & 0xFF
+        else:
+            self._header["offset"] = locations & 0xFFFFFF
+            self._header["sectors"] = locations >> 24
+        self._header["timestamp"] = numpy.frombuffer(header, dtype=dtype, count=1024, offset=4096)
+
+    @property
+    def header(self) -> numpy.ndarray:
+        """The location and timestamp tables, as a structured array.
+
+        Entry `x + z * 32` has the `offset`, `sectors` (count) and `timestamp` of chunk `x, z`."""
+        return self._header
+
+    def metadata(self, x: int, z: int) -> _Metadata:
+        """Return offset, sector count and timestamp of a chunk, without reading it."""
+        if not (0 <= x < 32 and 0 <= z < 32):
+            raise KeyError((x, z))
+        return _Metadata(*self._header[x + z * 32].item())
+
+    def chunk_size(self, x: int, z: int) -> int:
+        """Return the space in bytes used by the compressed chunk (0 if not generated)."""
+        return self.metadata(x, z).sectors * 4096
+
+    def external_path(self, x: int, z: int) -> Path:
+        """Return the file of a chunk too big for the region, `x` and `z` are within the region."""
+        try:
+            _, rx, rz, _ = self._filepath.name.split(".")
+            rx, rz = int(rx), int(rz)
+        except ValueError:
+            raise ValueError(f"{self._filepath.name} is not named r.X.Z.mca") from None
+        return self._filepath.with_name(f"c.{rx * 32 + x}.{rz * 32 + z}.mcc")
+
+    def __decode_chunk(
+        self,
+        coord: tuple[int, int],
+        metadata: _Metadata,
+        paths: "Paths | None",
+        chunk_filter: ChunkFilter | None,
+    ) -> tuple[Chunk | None, int]:
+        view = self.__open()
+        start = metadata.seek
+        chunk_lenght = int.from_bytes(view[start : start + 4], self.byteorder)
+        compression = view[start + 4]
+        self.__compressions[coord] = compression & ~EXTERNAL
+        if compression & EXTERNAL:
+            data = decompress(compression & ~EXTERNAL, self.external_path(*coord).read_bytes())
+        else:
+            # the payload is read straight from the memory map
+            with view[start + 5 : start + 4 + chunk_lenght] as payload:
+                data = decompress(compression, payload)
+        if chunk_filter is not None:
+            tags = values(data, chunk_filter.tags(), little_endian=(self.byteorder == "little"))
+            if not chunk_filter.match(tags):
+                return None, 0
+        if paths is not None:
+            data = project(data, paths, little_endian=(self.byteorder == "little"))
+        chunk_tag = amulet_nbt.load(data, little_endian=(self.byteorder == "little"))
+        return Chunk(chunk_tag.compound), len(data)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the decoded chunks (size of their NBT data)."""
+        return self.__nbytes
+
+    def read_chunks(
+        self,
+        coords: "Iterable[tuple[int, int]]",
+        cache=True,
+        paths: "Iterable[str] | None" = None,
+        chunk_filter: ChunkFilter | None = None,
+        bulk=False,
+    ) -> dict[tuple[int, int], Chunk | None]:
+        """Decode the chunks at `coords`, reading the file sequentially (in sector order).
+
+        With `cache` the decoded chunks are kept in memory, as `chunk` does,
+        otherwise they are only returned.
+        With `paths` (es: `["sections/Y", "sections/biomes"]`, see `minenbt.nbt`)
+        only those tags are decoded, these partial chunks are never cached.
+        Chunks rejected by `chunk_filter` are returned as None (and not cached).
+        With `bulk` (whole-region scans) the kernel is told the file is read sequentially."""
+        chunks: dict[tuple[int, int], Chunk | None] = {}
+        tree = None
+        if paths is not None:
+            tree = parse_paths(paths)
+            cache = False
+        if chunk_filter is not None:
+            cache = False
+        todo = sorted(set(coords), key=lambda c: self.metadata(*c).offset)
+        if not todo:
+            return chunks
+        if bulk:
+            self.__open()
+            self.__advise("MADV_SEQUENTIAL")
+        for coord in todo:
+            if coord in self.__chunks:
+                chunk = self.__chunks[coord]
+                if chunk and chunk_filter is not None and not chunk_filter.match_chunk(chunk):
+                    chunk = None
+                chunks[coord] = chunk
+                continue
+            metadata = self.metadata(*coord)
+            chunk = None
+            if metadata.is_valid():
+                chunk, size = self.__decode_chunk(coord, metadata, tree, chunk_filter)
+                if cache:
+                    self.__nbytes += size
+            if cache:
+                self.__chunks[coord] = chunk
+            chunks[coord] = chunk
+        if bulk:
+            self.__advise("MADV_NORMAL")
+        return chunks
+
+    def read_all(self) -> None:
+        """Decode every chunk not yet in memory, reading the file sequentially.
+
+        Bulk mode, meant for whole-region scans."""
+        if len(self.__chunks) == 1024:
             return
-        metadatas = sorted(self._metadatas.items(), key=lambda m: m[1].offset)
-        with open(self._filepath.absolute(), "rb") as mcafile:
-            for coord, metadata in metadatas:
-                if not metadata.is_valid():
-                    self.__chunks[coord] = None
-                    continue
-                mcafile.seek(metadata.seek)
-                chunk_lenght = self.__read_int_from_bytes(mcafile, 4)
-                compression = mcafile.read(1)[0]
-                if compression == 2:
-                    data = zlib.decompress(mcafile.read(chunk_lenght - 1))
-                else:
-                    raise NotImplementedError(f"Compression = {compression}")
-                chunk_tag = amulet_nbt.load(data, little_endian=(self.byteorder == "little"))
-                self.__chunks[coord] = Chunk(chunk_tag.compound)
+        self.read_chunks(((i % 32, i // 32) for i in range(1024)), bulk=True)
 
     def chunk(self, x: int, z: int) -> Chunk | None:
         """`x` and `z` refer to position within the region(AnvilFile)
 
-        It returns a Chunks(Compound tag), if available (generated)"""
-        if not self.__chunks:
-            self.__read_chunks()
+        It returns a Chunks(Compound tag), if available (generated).
+        Only the requested chunk is read and decoded."""
+        if (x, z) not in self.__chunks:
+            self.read_chunks([(x, z)])
         return self.__chunks[x, z]
 
-    def chunks(self) -> "Iterator[tuple[int, int, Chunk]]":
+    def xzs(self) -> "Iterator[tuple[int, int]]":
+        """Iterate `x, z` of the available (generated) chunks, without reading them."""
+        zs, xs = numpy.nonzero(self._header["offset"].reshape(32, 32))
+        yield from zip(xs.tolist(), zs.tolist())
+
+    def chunks(
+        self, bulk=True, chunk_filter: ChunkFilter | None = None
+    ) -> "Iterator[tuple[int, int, Chunk]]":
         """Iterate all available Chunks.
 
-        It returns `x, z, chunk`. `x` and `z` are relative to the region(AnvinFile)"""
-        for (x, z), metadata in self._metadatas.items():
-            if metadata.is_valid():
-                yield x, z, self.chunk(x, z)
+        It returns `x, z, chunk`. `x` and `z` are relative to the region(AnvinFile).
+        With `bulk` the whole file is decoded at once (see `read_all`),
+        otherwise every chunk is read on its own.
+        With `chunk_filter` only the accepted chunks are returned, they are not cached."""
+        if chunk_filter is not None:
+            chunks = self.read_chunks(
+                self.xzs(), cache=False, chunk_filter=chunk_filter, bulk=True
+            )
+            for x, z in self.xzs():
+                if chunks[x, z]:
+                    yield x, z, chunks[x, z]
+            return
+        if bulk:
+            self.read_all()
+        for x, z in self.xzs():
+            yield x, z, self.chunk(x, z)
 
     def find_chunk(self, x, z) -> Chunk | None:
         """Given a block `x` and `z`, returns the chunk that contains the block."""
         return self.chunk(x >> 4 & 31, z >> 4 & 31)
+
+    def set_chunk(self, x: int, z: int, chunk: Chunk) -> None:
+        """Replace (or add) the chunk at `x`, `z`, it will be written by `save`."""
+        self.metadata(x, z)
+        self.__chunks[x, z] = chunk
+        chunk.dirty = True
+
+    @property
+    def dirty(self) -> bool:
+        """True if some decoded chunk has been modified and not saved yet."""
+        return any(
+            chunk is not None
+            and (chunk.dirty or any(s is not None and s.dirty for s in chunk._sections.values()))
+            for chunk in self.__chunks.values()
+        )
+
+    def save(self) -> int:
+        """Write the modified chunks back to the file, returns how many they are.
+
+        Unchanged chunks are never written. A chunk reuses its sectors if it fits in them,
+        otherwise it's appended at the end of the file; its entries of the location
+        and timestamp tables are updated in place. Chunks bigger than 1 MiB
+        are stored in their own file (see `external_path`)."""
+        for chunk in self.__chunks.values():
+            if chunk is not None:
+                chunk.flush()
+        dirty = sorted(c for c, chunk in self.__chunks.items() if chunk is not None and chunk.dirty)
+        if not dirty:
+            return 0
+        # the file is written with plain I/O, the (read only) map is opened again when needed
+        self.close()
+        little_endian = self.byteorder == "little"
+        timestamp = int(time.time())
+        with open(self._filepath.absolute(), "r+b") as mcafile:
+            used = self._header["offset"].astype(numpy.int64) + self._header["sectors"]
+            # first free sector at the end of the file
+            end = max(2, -(-mcafile.seek(0, 2) // 4096), int(used.max()))
+            for x, z in dirty:
+                chunk = self.__chunks[x, z]
+                compression = compressor(self.__compressions.get((x, z), ZLIB))
+                data = chunk.to_nbt(compressed=False, little_endian=little_endian)
+                payload = compress(compression, data)
+                metadata = self.metadata(x, z)
+                if len(payload) + 5 > 255 * 4096:
+                    self.external_path(x, z).write_bytes(payload)
+                    record = (1).to_bytes(4, self.byteorder) + bytes([compression | EXTERNAL])
+                else:
+                    if metadata.is_valid():
+                        # the chunk was external, its own file is not needed anymore
+                        mcafile.seek(metadata.seek + 4)
+                        flag = mcafile.read(1)
+                        if flag and flag[0] & EXTERNAL:
+                            self.external_path(x, z).unlink(missing_ok=True)
+                    record = (
+                        (len(payload) + 1).to_bytes(4, self.byteorder)
+                        + bytes([compression])
+                        + payload
+                    )
+                sectors = -(-len(record) // 4096)
+                if metadata.is_valid() and sectors <= metadata.sectors:
+                    offset = metadata.offset
+                else:
+                    offset = end
+                    end += sectors
+                mcafile.seek(offset * 4096)
+                mcafile.write(record.ljust(sectors * 4096, b"\0"))
+                i = x + z * 32
+                if self.byteorder == "big":
+                    location = offset << 8 | sectors
+                else:
+                    location = sectors << 24 | offset
+                mcafile.seek(i * 4)
+                mcafile.write(location.to_bytes(4, self.byteorder))
+                mcafile.seek(4096 + i * 4)
+                mcafile.write(timestamp.to_bytes(4, self.byteorder))
+                self._header[i] = (offset, sectors, timestamp)
+                self.__compressions[x, z] = compression
+                chunk.dirty = False
+        return len(dirty)
@@ -0,0 +1,515 @@
+"""Persistent indexes of a Dimension, stored in SQLite files next to the save.
+
+Every indexed chunk is keyed by the timestamp and the offset in its region header,
+an update reads again only the chunks changed since the previous one."""
+import pickle
+import sqlite3
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+
+import numpy
+
+from .file_formats import AnvilFile
+from .utils import chunk_rings, parse_uuid
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from amulet_nbt import CompoundTag
+
+    from .savefolder import Dimension
+
+__all__ = ["cache_folder", "BlockIndex", "EntityIndex", "ScanCache"]
+
+
+def cache_folder(dimension: "Dimension") -> Path:
+    """Return (and create) the folder where the indexes of `dimension` are stored."""
+    folder = dimension._folder / ".minenbt"
+    folder.mkdir(exist_ok=True)
+    return folder
+
+
+class BlockIndex:
+    """Index of the block ids found in the palette of every section.
+
+    It maps a block id to the chunks and section `Y` where the block may appear,
+    so a search decodes only the candidate sections."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chunks (
+            rx INTEGER, rz INTEGER, cx INTEGER, cz INTEGER,
+            timestamp INTEGER, offset INTEGER,
+            PRIMARY KEY (rx, rz, cx, cz)
+        );
+        CREATE TABLE IF NOT EXISTS blocks (id INTEGER PRIMARY KEY, name TEXT UNIQUE);
+        CREATE TABLE IF NOT EXISTS sections (
+            block INTEGER, rx INTEGER, rz INTEGER, cx INTEGER, cz INTEGER, y INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS sections_block ON sections (block);
+        CREATE INDEX IF NOT EXISTS sections_chunk ON sections (rx, rz, cx, cz);
+    """
+
+    def __init__(self, dimension: "Dimension", path: str | Path | None = None) -> None:
+        self._regions = dimension.regions
+        self.path = Path(path) if path else cache_folder(dimension) / "blocks.sqlite"
+        self._db = sqlite3.connect(self.path)
+        self._db.executescript(self._SCHEMA)
+        self._block_ids = dict(self._db.execute("SELECT name, id FROM blocks"))
+
+    def __repr__(self) -> str:
+        return f"BlockIndex('{self.path.absolute()}')"
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __block_id(self, name: str) -> int:
+        if name not in self._block_ids:
+            cursor = self._db.execute("INSERT INTO blocks (name) VALUES (?)", (name,))
+            self._block_ids[name] = cursor.lastrowid
+        return self._block_ids[name]
+
+    def __delete(self, rx: int, rz: int, coords: "Iterable[tuple[int, int]]") -> None:
+        for table in ("chunks", "sections"):
+            self._db.executemany(
+                f"DELETE FROM {table} WHERE rx = ? AND rz = ? AND cx = ? AND cz = ?",
+                [(rx, rz, cx, cz) for cx, cz in coords],
+            )
+
+    def __update_region(self, rx: int, rz: int, region: AnvilFile) -> int:
+        stored = {
+            (cx, cz): (timestamp, offset)
+            for cx, cz, timestamp, offset in self._db.execute(
+                "SELECT cx, cz, timestamp, offset FROM chunks WHERE rx = ? AND rz = ?", (rx, rz)
+            )
+        }
+        current = {}
+        for cx, cz in region.xzs():
+            metadata = region.metadata(cx, cz)
+            current[cx, cz] = (metadata.timestamp, metadata.offset)
+        changed = [c for c, v in current.items() if stored.get(c) != v]
+        self.__delete(rx, rz, changed + [c for c in stored if c not in current])
+        rows = []
+        # only the palettes are needed, block states are never unpacked
+        paths = ("sections/Y", "sections/block_states/palette")
+        for (cx, cz), chunk in region.read_chunks(changed, cache=False, paths=paths).items():
+            if not chunk:
+                continue
+            for section in chunk.get("sections", ()):
+                if "block_states" not in section or "palette" not in section["block_states"]:
+                    continue
+                names = {p["Name"].py_str for p in section["block_states"]["palette"]}
+                y = section["Y"].py_int
+                rows.extend((self.__block_id(n), rx, rz, cx, cz, y) for n in names)
+        self._db.executemany("INSERT INTO sections VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self._db.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+            [(rx, rz, cx, cz, *current[cx, cz]) for cx, cz in changed],
+        )
+        return len(changed)
+
+    def update(self, progress: Callable[[int, int], None] | None = None) -> int:
+        """Index the chunks changed since the last update.
+
+        Returns the number of chunks read, `progress(done, total)` is called after every region."""
+        xzs = sorted(self._regions.xzs())
+        changed = 0
+        for i, (rx, rz) in enumerate(xzs):
+            region = AnvilFile(self._regions.path(rx, rz))
+            changed += self.__update_region(rx, rz, region)
+            region.close()
+            self._db.commit()
+            if progress:
+                progress(i + 1, len(xzs))
+        # regions deleted from the save
+        for rx, rz in set(self._db.execute("SELECT DISTINCT rx, rz FROM chunks")) - set(xzs):
+            for table in ("chunks", "sections"):
+                self._db.execute(f"DELETE FROM {table} WHERE rx = ? AND rz = ?", (rx, rz))
+        self._db.commit()
+        return changed
+
+    def candidates(
+        self, block_ids: "Iterable[str]"
+    ) -> dict[tuple[int, int], dict[tuple[int, int], set[int]]]:
+        """Return the sections whose palette contains any of `block_ids` (glob patterns allowed).
+
+        The result maps region `x, z` to chunk `x, z` (in the region) to the section `Y`s."""
+        results: dict[tuple[int, int], dict[tuple[int, int], set[int]]] = {}
+        for block_id in block_ids:
+            for rx, rz, cx, cz, y in self._db.execute(
+                "SELECT rx, rz, cx, cz, y FROM sections JOIN blocks ON sections.block = blocks.id"
+                " WHERE blocks.name GLOB ?",
+                (block_id,),
+            ):
+                results.setdefault((rx, rz), {}).setdefault((cx, cz), set()).add(y)
+        return results
+
+
+class EntityIndex:
+    """Index of the entities (and block entities): type, position, UUID and chunk of each one.
+
+    The entities are stored in SQLite, `load` reads them as column arrays
+    (`type`, `pos`, `uuid`, `chunk`, `flags`) with a uniform grid over `x, z`.
+    Queries return row numbers in the columns, no chunk is decoded."""
+
+    # flags of an entity
+    BRAIN = 1
+    ITEMS = 2
+    LOOT = 4
+    # side of a grid cell, in blocks
+    CELL = 64
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chunks (
+            rx INTEGER, rz INTEGER, cx INTEGER, cz INTEGER,
+            timestamp INTEGER, offset INTEGER,
+            PRIMARY KEY (rx, rz, cx, cz)
+        );
+        CREATE TABLE IF NOT EXISTS entities (
+            rx INTEGER, rz INTEGER, cx INTEGER, cz INTEGER,
+            type TEXT, x REAL, y REAL, z REAL, uuid TEXT, flags INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS entities_chunk ON entities (rx, rz, cx, cz);
+    """
+    # tags read from the changed chunks
+    _PATHS = (
+        "Entities/id",
+        "Entities/Pos",
+        "Entities/UUID",
+        "Entities/Brain",
+        "Entities/Items",
+        "Entities/LootTable",
+        "TileEntities/id",
+        "TileEntities/x",
+        "TileEntities/y",
+        "TileEntities/z",
+        "TileEntities/Items",
+        "TileEntities/LootTable",
+    )
+
+    def __init__(self, dimension: "Dimension", path: str | Path | None = None) -> None:
+        self._entities = dimension.entities
+        self.path = Path(path) if path else cache_folder(dimension) / "entities.sqlite"
+        self._db = sqlite3.connect(self.path)
+        self._db.executescript(self._SCHEMA)
+        # columns, read by load
+        self.types: list[str] = []
+        self.type = numpy.zeros(0, dtype=numpy.int32)
+        self.pos = numpy.zeros((0, 3))
+        self.uuid = numpy.zeros(0, dtype=object)
+        self.chunk = numpy.zeros((0, 4), dtype=numpy.int32)
+        self.flags = numpy.zeros(0, dtype=numpy.uint8)
+        self._order = numpy.zeros(0, dtype=numpy.intp)
+        self._cells: dict[tuple[int, int], tuple[int, int]] | None = None
+
+    def __repr__(self) -> str:
+        return f"EntityIndex('{self.path.absolute()}')"
+
+    def __len__(self) -> int:
+        self.__load()
+        return len(self.type)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __delete(self, rx: int, rz: int, coords: "Iterable[tuple[int, int]]") -> None:
+        for table in ("chunks", "entities"):
+            self._db.executemany(
+                f"DELETE FROM {table} WHERE rx = ? AND rz = ? AND cx = ? AND cz = ?",
+                [(rx, rz, cx, cz) for cx, cz in coords],
+            )
+
+    @classmethod
+    def __flags(cls, entity: "CompoundTag") -> int:
+        return (
+            (cls.BRAIN if "Brain" in entity else 0)
+            | (cls.ITEMS if "Items" in entity else 0)
+            | (cls.LOOT if "LootTable" in entity else 0)
+        )
+
+    def __chunk_rows(self, chunk: "CompoundTag") -> list[tuple]:
+        """Return `type, x, y, z, uuid, flags` of every entity in the chunk."""
+        rows: list[tuple] = []
+        for e in chunk.get("Entities", ()):
+            if "id" not in e or "Pos" not in e:
+                continue
+            try:
+                uuid = str(parse_uuid(e)) if "UUID" in e else None
+            except ValueError:
+                # before MC 1.16
+                uuid = None
+            pos = [v.py_float for v in e["Pos"].py_list]
+            rows.append((e["id"].py_str, *pos, uuid, self.__flags(e)))
+        for e in chunk.get("TileEntities", ()):
+            if "id" not in e or "x" not in e:
+                continue
+            pos = [e[k].py_int for k in ("x", "y", "z")]
+            rows.append((e["id"].py_str, *pos, None, self.__flags(e)))
+        return rows
+
+    def __update_region(self, rx: int, rz: int, region: AnvilFile) -> int:
+        stored = {
+            (cx, cz): (timestamp, offset)
+            for cx, cz, timestamp, offset in self._db.execute(
+                "SELECT cx, cz, timestamp, offset FROM chunks WHERE rx = ? AND rz = ?", (rx, rz)
+            )
+        }
+        current = {}
+        for cx, cz in region.xzs():
+            metadata = region.metadata(cx, cz)
+            current[cx, cz] = (metadata.timestamp, metadata.offset)
+        changed = [c for c, v in current.items() if stored.get(c) != v]
+        gone = [c for c in stored if c not in current]
+        self.__delete(rx, rz, changed + gone)
+        rows = []
+        for (cx, cz), chunk in region.read_chunks(changed, cache=False, paths=self._PATHS).items():
+            if chunk:
+                rows.extend((rx, rz, cx, cz, *row) for row in self.__chunk_rows(chunk))
+        self._db.executemany("INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._db.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+            [(rx, rz, cx, cz, *current[cx, cz]) for cx, cz in changed],
+        )
+        return len(changed) + len(gone)
+
+    def update(self, progress: Callable[[int, int], None] | None = None) -> int:
+        """Index the chunks changed since the last update.
+
+        Returns the number of chunks changed (or deleted),
+        `progress(done, total)` is called after every region."""
+        xzs = sorted(self._entities.xzs())
+        changed = 0
+        for i, (rx, rz) in enumerate(xzs):
+            region = AnvilFile(self._entities.path(rx, rz))
+            changed += self.__update_region(rx, rz, region)
+            region.close()
+            self._db.commit()
+            if progress:
+                progress(i + 1, len(xzs))
+        # regions deleted from the save
+        for rx, rz in set(self._db.execute("SELECT DISTINCT rx, rz FROM chunks")) - set(xzs):
+            for table in ("chunks", "entities"):
+                self._db.execute(f"DELETE FROM {table} WHERE rx = ? AND rz = ?", (rx, rz))
+            changed += 1
+        self._db.commit()
+        if changed:
+            self._cells = None
+        return changed
+
+    def load(self) -> None:
+        """Read the columns and build the grid, queries call it when needed."""
+        rows = self._db.execute(
+            "SELECT rx, rz, cx, cz, type, x, y, z, uuid, flags FROM entities"
+        ).fetchall()
+        columns = list(zip(*rows)) or [()] * 10
+        types, inverse = numpy.unique(numpy.array(columns[4], dtype=object), return_inverse=True)
+        self.types = types.tolist()
+        self.type = inverse.reshape(-1).astype(numpy.int32)
+        self.pos = numpy.array(columns[5:8], dtype=numpy.float64).T.reshape(-1, 3)
+        self.uuid = numpy.array(columns[8], dtype=object)
+        self.chunk = numpy.array(columns[:4], dtype=numpy.int32).T.reshape(-1, 4)
+        self.flags = numpy.array(columns[9], dtype=numpy.uint8)
+        # rows sorted by grid cell, every cell is a slice of `_order`
+        cells = numpy.floor(self.pos[:, [0, 2]] / self.CELL).astype(numpy.int64)
+        self._order = numpy.lexsort((cells[:, 1], cells[:, 0]))
+        self._cells = {}
+        if rows:
+            keys, starts, counts = numpy.unique(
+                cells[self._order], axis=0, return_index=True, return_counts=True
+            )
+            for (gx, gz), start, count in zip(keys.tolist(), starts.tolist(), counts.tolist()):
+                self._cells[gx, gz] = (start, start + count)
+
+    def __load(self) -> dict[tuple[int, int], tuple[int, int]]:
+        if self._cells is None:
+            self.load()
+        return self._cells
+
+    def __rows(self, cells: "Iterable[tuple[int, int]]") -> numpy.ndarray:
+        """Return the rows in the grid `cells`."""
+        grid = self.__load()
+        parts = [self._order[slice(*grid[c])] for c in cells if c in grid]
+        return numpy.concatenate(parts) if parts else numpy.zeros(0, dtype=numpy.intp)
+
+    def __box_rows(self, x1: float, z1: float, x2: float, z2: float) -> numpy.ndarray:
+        """Return the rows in the grid cells overlapping the box from `x1, z1` to `x2, z2`."""
+        grid = self.__load()
+        gx1, gz1, gx2, gz2 = (int(v // self.CELL) for v in (x1, z1, x2, z2))
+        if (gx2 - gx1 + 1) * (gz2 - gz1 + 1) > len(grid):
+            cells = [(gx, gz) for gx, gz in grid if gx1 <= gx <= gx2 and gz1 <= gz <= gz2]
+        else:
+            cells = [(gx, gz) for gx in range(gx1, gx2 + 1) for gz in range(gz1, gz2 + 1)]
+        return self.__rows(cells)
+
+    def __select(
+        self, rows: numpy.ndarray, types: "Iterable[str] | None", flags: int
+    ) -> numpy.ndarray:
+        """Keep the `rows` matching any of `types` (glob patterns) and any of `flags`."""
+        if types is not None:
+            patterns = list(types)
+            ids = [
+                i
+                for i, name in enumerate(self.types)
+                if any(fnmatchcase(name, p) for p in patterns)
+            ]
+            rows = rows[numpy.isin(self.type[rows], ids)]
+        if flags:
+            rows = rows[(self.flags[rows] & flags) != 0]
+        return rows
+
+    def __distances(
+        self, rows: numpy.ndarray, x: float, y: float | None, z: float
+    ) -> numpy.ndarray:
+        if y is None:
+            return numpy.sqrt(((self.pos[rows][:, [0, 2]] - (x, z)) ** 2).sum(axis=1))
+        return numpy.sqrt(((self.pos[rows] - (x, y, z)) ** 2).sum(axis=1))
+
+    def of_type(self, types: "Iterable[str] | None" = None, flags=0) -> numpy.ndarray:
+        """Return the rows of the entities matching any of `types` (glob patterns, es:
+        `minecraft:*_minecart`) and having any of `flags` (es: `EntityIndex.BRAIN`)."""
+        self.__load()
+        return self.__select(numpy.arange(len(self.type)), types, flags)
+
+    def bbox(
+        self,
+        x1: float,
+        y1: float,
+        z1: float,
+        x2: float,
+        y2: float,
+        z2: float,
+        types: "Iterable[str] | None" = None,
+        flags=0,
+    ) -> numpy.ndarray:
+        """Return the rows of the entities inside the box (bounds included), sorted.
+
+        `types` and `flags` as `of_type`."""
+        rows = self.__select(self.__box_rows(x1, z1, x2, z2), types, flags)
+        pos = self.pos[rows]
+        inside = numpy.all((pos >= (x1, y1, z1)) & (pos <= (x2, y2, z2)), axis=1)
+        return numpy.sort(rows[inside])
+
+    def radius(
+        self,
+        x: float,
+        y: float | None,
+        z: float,
+        r: float,
+        types: "Iterable[str] | None" = None,
+        flags=0,
+    ) -> numpy.ndarray:
+        """Return the rows of the entities within `r` blocks from `x, y, z`, nearest first.
+
+        With `y` None the distance is horizontal (only `x, z`, as `--distance`).
+        `types` and `flags` as `of_type`."""
+        rows = self.__select(self.__box_rows(x - r, z - r, x + r, z + r), types, flags)
+        distances = self.__distances(rows, x, y, z)
+        near = distances <= r
+        return rows[near][numpy.argsort(distances[near], kind="stable")]
+
+    def nearest(
+        self,
+        x: float,
+        y: float | None,
+        z: float,
+        k=1,
+        types: "Iterable[str] | None" = None,
+        flags=0,
+    ) -> numpy.ndarray:
+        """Return the rows of the `k` entities nearest to `x, y, z`, nearest first.
+
+        `y`, `types` and `flags` as `radius`."""
+        grid = self.__load()
+        found = []
+        count = 0
+        # the grid cells around x, z, ring by ring (a cell is scaled to a chunk)
+        rings = chunk_rings(int(x // self.CELL) << 4, int(z // self.CELL) << 4)
+        for ring, cells in enumerate(rings):
+            if len(cells) > len(grid):
+                # faster to check every entity than every cell of the rings left
+                found = [self.of_type(types, flags)]
+                break
+            rows = self.__select(self.__rows(cells), types, flags)
+            found.append(rows)
+            count += len(rows)
+            if count >= k:
+                distances = self.__distances(numpy.concatenate(found), x, y, z)
+                # the entities in the next rings are at least `ring * CELL` blocks away
+                if numpy.partition(distances, k - 1)[k - 1] <= ring * self.CELL:
+                    break
+        rows = numpy.concatenate(found)
+        distances = self.__distances(rows, x, y, z)
+        return rows[numpy.argsort(distances, kind="stable")[:k]]
+
+
+class ScanCache:
+    """Results of a scan function for every chunk (see `minenbt.scan.map_chunks`).
+
+    `scan` names the function and its parameters,
+    the results of different scans can be stored in the same file."""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            scan TEXT, rx INTEGER, rz INTEGER, cx INTEGER, cz INTEGER,
+            timestamp INTEGER, offset INTEGER, result BLOB,
+            PRIMARY KEY (scan, rx, rz, cx, cz)
+        );
+    """
+
+    def __init__(self, dimension: "Dimension", scan: str, path: str | Path | None = None) -> None:
+        self.scan = scan
+        self.path = Path(path) if path else cache_folder(dimension) / "scans.sqlite"
+        self._db = sqlite3.connect(self.path)
+        self._db.executescript(self._SCHEMA)
+
+    def __repr__(self) -> str:
+        return f"ScanCache('{self.path.absolute()}', {self.scan!r})"
+
+    def close(self) -> None:
+        self._db.close()
+
+    def versions(self, rx: int, rz: int) -> dict[tuple[int, int], tuple[int, int]]:
+        """Return chunk `x, z` -> `timestamp, offset` of the stored results of a region."""
+        return {
+            (cx, cz): (timestamp, offset)
+            for cx, cz, timestamp, offset in self._db.execute(
+                "SELECT cx, cz, timestamp, offset FROM results"
+                " WHERE scan = ? AND rx = ? AND rz = ?",
+                (self.scan, rx, rz),
+            )
+        }
+
+    def results(self, rx: int, rz: int) -> dict[tuple[int, int], Any]:
+        """Return chunk `x, z` -> result of the stored results of a region."""
+        return {
+            (cx, cz): pickle.loads(result)
+            for cx, cz, result in self._db.execute(
+                "SELECT cx, cz, result FROM results WHERE scan = ? AND rx = ? AND rz = ?",
+                (self.scan, rx, rz),
+            )
+        }
+
+    def store(
+        self,
+        rx: int,
+        rz: int,
+        versions: dict[tuple[int, int], tuple[int, int]],
+        results: dict[tuple[int, int], Any],
+    ) -> None:
+        """Store the `results` of a region.
+
+        `versions` maps every chunk in the region to its `timestamp, offset`,
+        stored results of chunks no longer in the region are deleted."""
+        gone = [c for c in self.versions(rx, rz) if c not in versions]
+        self._db.executemany(
+            "DELETE FROM results WHERE scan = ? AND rx = ? AND rz = ? AND cx = ? AND cz = ?",
+            [(self.scan, rx, rz, cx, cz) for cx, cz in gone],
+        )
+        self._db.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (self.scan, rx, rz, cx, cz, *versions[cx, cz], pickle.dumps(result))
+                for (cx, cz), result in results.items()
+            ],
+        )
+        self._db.commit()
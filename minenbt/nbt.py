@@ -0,0 +1,164 @@
+"""Partial decoding of uncompressed NBT data.
+
+`project` copies only the requested tags of an NBT payload into a new (smaller) payload,
+every other tag is skipped by its length, without building any tag.
+The result can be loaded by `amulet_nbt.load` as usual.
+
+Paths are `/` separated keys, es: `sections/biomes` keeps only `biomes`
+in every compound of the `sections` list. A path to a tag keeps the whole tag."""
+import struct
+from typing import TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+__all__ = ["Paths", "parse_paths", "project", "values"]
+
+# key -> sub paths (None = the whole tag)
+Paths = dict[bytes, Union["Paths", None]]
+
+_TAG_END = 0
+_TAG_STRING = 8
+_TAG_LIST = 9
+_TAG_COMPOUND = 10
+# size of the payload of numeric tags
+_SIZES = {1: 1, 2: 2, 3: 4, 4: 8, 5: 4, 6: 8}
+# struct format of numeric tags
+_FORMATS = {1: "b", 2: "h", 3: "i", 4: "q", 5: "f", 6: "d"}
+# size of the elements of array tags
+_ARRAYS = {7: 1, 11: 4, 12: 8}
+
+
+def parse_paths(paths: "Iterable[str]") -> Paths:
+    """Merge `paths` (es: `["DataVersion", "sections/Y", "sections/biomes"]`) in a tree."""
+    tree: Paths = {}
+    for path in paths:
+        keys = [k.encode("utf-8") for k in path.split("/")]
+        node = tree
+        for key in keys[:-1]:
+            if key in node and node[key] is None:
+                # the whole tag is already requested
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[keys[-1]] = None
+    return tree
+
+
+class _Projection:
+    def __init__(self, data: "bytes | memoryview", little_endian: bool) -> None:
+        self.data = data
+        endian = "<" if little_endian else ">"
+        self.endian = endian
+        self.u16 = struct.Struct(endian + "H").unpack_from
+        self.i32 = struct.Struct(endian + "i").unpack_from
+
+    def skip(self, tag: int, pos: int) -> int:
+        """Return the position after the payload of a `tag` starting at `pos`."""
+        if tag in _SIZES:
+            return pos + _SIZES[tag]
+        if tag in _ARRAYS:
+            return pos + 4 + self.i32(self.data, pos)[0] * _ARRAYS[tag]
+        if tag == _TAG_STRING:
+            return pos + 2 + self.u16(self.data, pos)[0]
+        if tag == _TAG_LIST:
+            element = self.data[pos]
+            length = self.i32(self.data, pos + 1)[0]
+            pos += 5
+            if element in _SIZES:
+                return pos + max(length, 0) * _SIZES[element]
+            for _ in range(length):
+                pos = self.skip(element, pos)
+            return pos
+        if tag == _TAG_COMPOUND:
+            while True:
+                child = self.data[pos]
+                if child == _TAG_END:
+                    return pos + 1
+                pos = self.skip(child, pos + 3 + self.u16(self.data, pos + 1)[0])
+        raise ValueError(f"Unknown tag {tag} at {pos}")
+
+    def compound(self, pos: int, paths: Paths, out: bytearray) -> int:
+        """Copy the payload of the compound at `pos` to `out`, only the tags in `paths`.
+
+        Returns the position after the compound."""
+        data = self.data
+        while True:
+            start = pos
+            tag = data[pos]
+            if tag == _TAG_END:
+                out.append(_TAG_END)
+                return pos + 1
+            name_length = self.u16(data, pos + 1)[0]
+            pos += 3 + name_length
+            name = bytes(data[start + 3 : pos])
+            if name not in paths:
+                pos = self.skip(tag, pos)
+                continue
+            sub = paths[name]
+            if sub is None or tag not in (_TAG_LIST, _TAG_COMPOUND):
+                pos = self.skip(tag, pos)
+                out += data[start:pos]
+            elif tag == _TAG_COMPOUND:
+                out += data[start:pos]
+                pos = self.compound(pos, sub, out)
+            elif data[pos] != _TAG_COMPOUND:
+                # only lists of compounds can be filtered
+                pos = self.skip(tag, pos)
+                out += data[start:pos]
+            else:
+                out += data[start : pos + 5]
+                length = self.i32(data, pos + 1)[0]
+                pos += 5
+                for _ in range(length):
+                    pos = self.compound(pos, sub, out)
+
+    def values(self, pos: int, names: set[bytes]) -> "dict[str, int | float | str]":
+        """Return the numeric and string tags `names` of the compound at `pos`."""
+        data = self.data
+        found: dict[str, int | float | str] = {}
+        while len(found) < len(names):
+            tag = data[pos]
+            if tag == _TAG_END:
+                break
+            start = pos + 3
+            pos = start + self.u16(data, pos + 1)[0]
+            name = bytes(data[start:pos])
+            if name in names:
+                if tag in _FORMATS:
+                    found[name.decode("utf-8")] = struct.unpack_from(
+                        self.endian + _FORMATS[tag], data, pos
+                    )[0]
+                elif tag == _TAG_STRING:
+                    size = self.u16(data, pos)[0]
+                    found[name.decode("utf-8")] = bytes(data[pos + 2 : pos + 2 + size]).decode(
+                        "utf-8", errors="replace"
+                    )
+            pos = self.skip(tag, pos)
+        return found
+
+
+def project(data: "bytes | memoryview", paths: Paths, little_endian=False) -> bytes:
+    """Return a copy of the NBT `data` (uncompressed) with only the tags in `paths`.
+
+    `paths` comes from `parse_paths`, the root tag must be a compound."""
+    if data[0] != _TAG_COMPOUND:
+        raise ValueError(f"The root tag should be a compound, not {data[0]}")
+    projection = _Projection(data, little_endian)
+    pos = 3 + projection.u16(data, 1)[0]
+    out = bytearray(data[:pos])
+    projection.compound(pos, paths, out)
+    return bytes(out)
+
+
+def values(
+    data: "bytes | memoryview", names: "Iterable[str]", little_endian=False
+) -> "dict[str, int | float | str]":
+    """Return the numeric and string tags `names` of the root compound of `data`.
+
+    Nothing is copied, the scan stops as soon as every tag is found.
+    Missing tags, or tags of other types, are not returned."""
+    if data[0] != _TAG_COMPOUND:
+        raise ValueError(f"The root tag should be a compound, not {data[0]}")
+    projection = _Projection(data, little_endian)
+    return projection.values(3 + projection.u16(data, 1)[0], {n.encode("utf-8") for n in names})
@@ -1,40 +1,210 @@
+import heapq
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, NamedTuple
 
 from minenbt.file_formats import NbtFile
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable
+    from collections.abc import Iterable, Iterator
 
+    from minenbt.file_formats import Chunk, ChunkFilter
+
+import numpy
 from amulet_nbt import CompoundTag, StringTag
 
 from . import AnvilFile
-from .utils import parse_uuid
+from .utils import Coord, near_regions, parse_uuid
+
+__all__ = ["SaveFolder", "Dimension", "AnvilFolder", "CacheInfo"]
+
 
-__all__ = ["SaveFolder", "Dimension", "AnvilFolder"]
+class CacheInfo(NamedTuple):
+    """Statistics of the regions cache of an `AnvilFolder`."""
+
+    hits: int
+    misses: int
+    evictions: int
+    regions: int
+    nbytes: int
 
 
 class AnvilFolder:
-    def __init__(self, files: dict[tuple[int, int], Path]) -> None:
+    """A folder of region(AnvilFile) files.
+
+    Opened regions are cached and evicted in LRU order
+    when there are more than `max_regions` of them
+    or when their decoded chunks are estimated to use more than `max_bytes`.
+    By default the cache is unbounded.
+    Regions with modified chunks are saved before leaving the cache, see `save`.
+
+    Only the `max_mapped` most recently used regions keep their file memory mapped
+    (every map holds a file descriptor), the others are mapped again when needed."""
+
+    max_mapped = 64
+
+    def __init__(
+        self,
+        files: dict[tuple[int, int], Path],
+        max_regions: int | None = None,
+        max_bytes: int | None = None,
+    ) -> None:
         self._files = files
-        self._anvils = {}  # type: dict[tuple[int, int], AnvilFile]
+        self._anvils = OrderedDict()  # type: OrderedDict[tuple[int, int], AnvilFile]
+        self.max_regions = max_regions
+        self.max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
 
     def single(self, x: int, z: int) -> AnvilFile:
-        if (x, z) not in self._anvils:
+        if (x, z) in self._anvils:
+            self._hits += 1
+            self._anvils.move_to_end((x, z))
+        else:
+            self._misses += 1
             self._anvils[x, z] = AnvilFile(self._files[x, z])
+        self.__evict()
+        for region in islice(self._anvils.values(), max(len(self._anvils) - self.max_mapped, 0)):
+            region.close()
         return self._anvils[x, z]
 
-    def all(self) -> "Iterable[tuple[int, int, AnvilFile]]":
+    def __evict(self) -> None:
+        # the last used region is never evicted
+        while len(self._anvils) > 1 and (
+            (self.max_regions is not None and len(self._anvils) > self.max_regions)
+            or (self.max_bytes is not None and self.nbytes() > self.max_bytes)
+        ):
+            _, region = self._anvils.popitem(last=False)
+            region.save()
+            region.close()
+            self._evictions += 1
+
+    def release(self, x: int, z: int) -> None:
+        """Remove a region from the cache, saving its modified chunks.
+
+        Read-only helpers use `peek` instead, they never release the regions of the caller."""
+        region = self._anvils.pop((x, z), None)
+        if region:
+            region.save()
+            region.close()
+
+    @contextmanager
+    def peek(self, x: int, z: int) -> "Iterator[AnvilFile]":
+        """Use a region without changing the cache: the cached one if any,
+        otherwise one opened only for the `with` block, then closed (not saved)."""
+        region = self._anvils.get((x, z))
+        if region is not None:
+            yield region
+            return
+        region = AnvilFile(self._files[x, z])
+        try:
+            yield region
+        finally:
+            region.close()
+
+    def save(self) -> int:
+        """Write the modified chunks of the cached regions, returns how many they are."""
+        return sum(region.save() for region in self._anvils.values())
+
+    def nbytes(self) -> int:
+        """Approximate memory used by the cached regions."""
+        return sum(a.nbytes for a in self._anvils.values())
+
+    def cache_info(self) -> CacheInfo:
+        """Return hits, misses and evictions counters of the regions cache."""
+        return CacheInfo(
+            self._hits, self._misses, self._evictions, len(self._anvils), self.nbytes()
+        )
+
+    def all(self, stream=False) -> "Iterable[tuple[int, int, AnvilFile]]":
         """Iterate all available Regions(AnvilFiles).
 
-        It returns `x, z, region`. `x` and `z` are expressed in the filename."""
-        for x, z in self._files.keys():
-            yield x, z, self.single(x, z)
+        It returns `x, z, region`. `x` and `z` are expressed in the filename.
+        With `stream` the regions not in the cache are not added to it:
+        every one is saved and closed as soon as the next one is requested."""
+        for x, z in list(self._files.keys()):
+            if not stream or (x, z) in self._anvils:
+                yield x, z, self.single(x, z)
+                continue
+            region = AnvilFile(self._files[x, z])
+            yield x, z, region
+            region.save()
+            region.close()
+
+    def near_chunks(
+        self,
+        x: int,
+        z: int,
+        distance,
+        paths: "Iterable[str] | None" = None,
+        chunk_filter: "ChunkFilter | None" = None,
+    ) -> "Iterator[tuple[Coord, Chunk]]":
+        """Yield `coord, chunk` for every generated chunk within `distance` from `(x, z)`,
+        from nearest to farthest. `coord` is the origin of the chunk.
+        With `paths` only those tags are decoded, with `chunk_filter` only the accepted chunks
+        are returned (see `AnvilFile.read_chunks`).
+
+        Candidate chunks are grouped by region using only the region headers.
+        A region is read once, in sector order, when its nearest candidate is reached,
+        and it is released after its last candidate.
+        Regions not in the cache are not added to it."""
+        start = Coord(x, 0, z)
+        # (distance, 0, region x, z) or (distance, 1, chunk origin):
+        # a region is expanded before its chunks, which can not be nearer than the region
+        heap: list[tuple[float, int, tuple]] = []
+        for rx, rz in near_regions(x, z, distance):
+            if (rx, rz) not in self._files:
+                continue
+            nearest = Coord(
+                min(max(x, rx << 9), (rx << 9) + 511), 0, min(max(z, rz << 9), (rz << 9) + 511)
+            )
+            heapq.heappush(heap, (start.distance(nearest), 0, (rx, rz)))
+        # region x, z -> region, candidates left, decoded candidates
+        pending: dict[tuple[int, int], tuple[AnvilFile, set, dict]] = {}
+        while heap:
+            _, kind, key = heapq.heappop(heap)
+            if kind == 0:
+                xz = key
+                region = self._anvils.get(xz) or AnvilFile(self._files[xz])
+                candidates = set()
+                for cx, cz in region.xzs():
+                    point = Coord.compose(xz, (cx, cz))
+                    point_distance = start.distance(point)
+                    if point_distance <= distance:
+                        candidates.add((cx, cz))
+                        heapq.heappush(heap, (point_distance, 1, point))
+                if candidates:
+                    pending[xz] = (region, candidates, {})
+                continue
+            coord = key
+            region_xz = coord.region()
+            region, candidates, decoded = pending[region_xz]
+            if not decoded:
+                decoded.update(
+                    region.read_chunks(
+                        candidates, cache=False, paths=paths, chunk_filter=chunk_filter
+                    )
+                )
+            candidates.discard(coord.chunk())
+            chunk = decoded.pop(coord.chunk())
+            if not candidates:
+                del pending[region_xz]
+                if region_xz not in self._anvils:
+                    region.close()
+            if chunk:
+                yield coord, chunk
 
     def xzs(self) -> "Iterable[tuple[int, int]]":
         """Iterate all regions, return x, z for that region."""
         yield from self._files.keys()
 
+    def path(self, x: int, z: int) -> Path:
+        """Return the file of a region, `x` and `z` are expressed in the filename."""
+        return self._files[x, z]
+
     def find(self, x: int, z: int) -> AnvilFile:
         """Given a block `x` and `z`, returns the region that contains the block."""
         return self.single(x >> 9, z >> 9)
@@ -44,26 +214,50 @@ class AnvilFolder:
         return self.single(x >> 9, z >> 9).chunk(x >> 4 & 31, z >> 4 & 31)
 
     @staticmethod
-    def from_folder(base_folder: "Path", folder_name: str, filter="r.*.mca") -> "AnvilFolder":
+    def from_folder(
+        base_folder: "Path", folder_name: str, filter="r.*.mca", **kwargs
+    ) -> "AnvilFolder":
+        """Build an AnvilFolder from a folder, `kwargs` are the cache policy."""
         entity_files = {}
-        for mcafile in (base_folder / folder_name).glob("r.*.mca"):
+        for mcafile in (base_folder / folder_name).glob(filter):
             _, sx, sz, _ = mcafile.name.split(".")
             entity_files[int(sx), int(sz)] = mcafile
-        return AnvilFolder(entity_files)
+        return AnvilFolder(entity_files, **kwargs)
+
+
+def _box_chunks(
+    region: AnvilFile, rx: int, rz: int, x1: int, z1: int, x2: int, z2: int
+) -> list[tuple[int, int]]:
+    """Return the generated chunks of the region overlapping the box, `x1 <= x2, z1 <= z2`."""
+    return [
+        (cx, cz)
+        for cx, cz in region.xzs()
+        if x1 >> 4 <= rx * 32 + cx <= x2 >> 4 and z1 >> 4 <= rz * 32 + cz <= z2 >> 4
+    ]
+
+
+def _box_slice(origin: int, start: int, stop: int) -> slice:
+    """Return the part of the 16 blocks from `origin` inside `start` - `stop` (included)."""
+    return slice(max(start - origin, 0), min(stop - origin, 15) + 1)
 
 
 class Dimension:
-    """A Dimension (folder) in Minecraft"""
+    """A Dimension (folder) in Minecraft
 
-    def __init__(self, folder: str | Path) -> None:
+    `max_regions` and `max_bytes` are the cache policy of every `AnvilFolder`."""
+
+    def __init__(
+        self, folder: str | Path, max_regions: int | None = None, max_bytes: int | None = None
+    ) -> None:
         self._folder = Path(folder)
         if not self._folder.exists():
             raise ValueError(f"Path {folder} does not exists")
         if not self._folder.is_dir():
             raise ValueError(f"Path {folder} is not a folder")
-        self.regions = AnvilFolder.from_folder(self._folder, "region")
-        self.entities = AnvilFolder.from_folder(self._folder, "entities")
-        self.pois = AnvilFolder.from_folder(self._folder, "poi")
+        policy = {"max_regions": max_regions, "max_bytes": max_bytes}
+        self.regions = AnvilFolder.from_folder(self._folder, "region", **policy)
+        self.entities = AnvilFolder.from_folder(self._folder, "entities", **policy)
+        self.pois = AnvilFolder.from_folder(self._folder, "poi", **policy)
 
     def raid(self) -> "Iterable[NbtFile]":
         """Return raid information as an NbtFile."""
@@ -83,6 +277,131 @@ class Dimension:
             return NbtFile(mcafile.absolute())
         return None
 
+    def block_at(self, x: int, y: int, z: int) -> str | None:
+        """Return the block id at the given world coordinates, if available.
+
+        Regions, chunks and sections are cached, repeated lookups are cheap."""
+        try:
+            chunk = self.regions.find_chunk(x, z)
+        except KeyError:
+            return None
+        if not chunk:
+            return None
+        section = chunk.find_section(y)
+        if not section:
+            return None
+        return section.find_block(x, y, z)
+
+    def replace(
+        self,
+        block_ids: "Iterable[str]",
+        block: "str | CompoundTag",
+        x1: int,
+        y1: int,
+        z1: int,
+        x2: int,
+        y2: int,
+        z2: int,
+    ) -> int:
+        """Replace the blocks matching `block_ids` (ids or glob patterns) with `block`
+        (an id or a palette entry) in the box from `x1, y1, z1` to `x2, y2, z2`, included.
+
+        Every region is changed and then saved (see `AnvilFile.save`) before the next one,
+        regions not in the cache are not added to it.
+        Returns how many blocks are replaced."""
+        block_ids = tuple(block_ids)
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        z1, z2 = sorted((z1, z2))
+        regions = set(self.regions.xzs())
+        replaced = 0
+        for rx in range(x1 >> 9, (x2 >> 9) + 1):
+            for rz in range(z1 >> 9, (z2 >> 9) + 1):
+                if (rx, rz) not in regions:
+                    continue
+                with self.regions.peek(rx, rz) as region:
+                    coords = _box_chunks(region, rx, rz, x1, z1, x2, z2)
+                    # chunks are cached by the region, to be saved
+                    for (cx, cz), chunk in region.read_chunks(coords).items():
+                        if not chunk:
+                            continue
+                        xs = _box_slice((rx * 32 + cx) * 16, x1, x2)
+                        zs = _box_slice((rz * 32 + cz) * 16, z1, z2)
+                        for section in chunk.sections():
+                            oy = section["Y"].py_int * 16
+                            if oy + 15 < y1 or oy > y2:
+                                continue
+                            mask = numpy.zeros((16, 16, 16), dtype=bool)
+                            mask[_box_slice(oy, y1, y2), zs, xs] = True
+                            replaced += section.replace(block_ids, block, mask)
+                    region.save()
+        return replaced
+
+    def volume(
+        self,
+        x1: int,
+        y1: int,
+        z1: int,
+        x2: int,
+        y2: int,
+        z2: int,
+        dtype=numpy.uint16,
+        path: "Path | str | None" = None,
+    ) -> "tuple[numpy.ndarray, list[str | None]]":
+        """Return the blocks in the box from `x1, y1, z1` to `x2, y2, z2` (included)
+        as a (y, z, x) array of ids, and the palette of the ids.
+
+        Id 0 (`None` in the palette) is used where chunks or sections are missing.
+        Only the chunks overlapping the box are read (and not cached),
+        their sections are copied in place as whole arrays.
+        With `path` the array is a memory mapped `.npy` file, for boxes bigger than the memory."""
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        z1, z2 = sorted((z1, z2))
+        shape = (y2 - y1 + 1, z2 - z1 + 1, x2 - x1 + 1)
+        if path is None:
+            blocks = numpy.zeros(shape, dtype=dtype)
+        else:
+            blocks = numpy.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        palette: list[str | None] = [None]
+        ids: dict[str, int] = {}
+        paths = ("DataVersion", "sections/Y", "sections/block_states")
+        regions = set(self.regions.xzs())
+        for rx in range(x1 >> 9, (x2 >> 9) + 1):
+            for rz in range(z1 >> 9, (z2 >> 9) + 1):
+                if (rx, rz) not in regions:
+                    continue
+                region = AnvilFile(self.regions.path(rx, rz))
+                coords = _box_chunks(region, rx, rz, x1, z1, x2, z2)
+                for (cx, cz), chunk in region.read_chunks(coords, cache=False, paths=paths).items():
+                    if not chunk:
+                        continue
+                    ox, oz = (rx * 32 + cx) * 16, (rz * 32 + cz) * 16
+                    xs, zs = _box_slice(ox, x1, x2), _box_slice(oz, z1, z2)
+                    for section in chunk.sections():
+                        oy = section["Y"].py_int * 16
+                        states = section.states()
+                        if states is None or oy + 15 < y1 or oy > y2:
+                            continue
+                        names, indexes = states
+                        for name in names:
+                            if name not in ids:
+                                ids[name] = len(palette)
+                                palette.append(name)
+                        if len(palette) > numpy.iinfo(dtype).max + 1:
+                            raise ValueError(f"More than {len(palette) - 1} blocks for {dtype}")
+                        lut = numpy.array([ids[n] for n in names], dtype=dtype)
+                        ys = _box_slice(oy, y1, y2)
+                        blocks[
+                            oy + ys.start - y1 : oy + ys.stop - y1,
+                            oz + zs.start - z1 : oz + zs.stop - z1,
+                            ox + xs.start - x1 : ox + xs.stop - x1,
+                        ] = lut[indexes[ys, zs, xs]]
+                region.close()
+        if path is not None:
+            blocks.flush()
+        return blocks, palette
+
     def __repr__(self) -> str:
         return f"Dimension('{self._folder.absolute()}')"
 
@@ -0,0 +1,213 @@
+"""Scan the regions of an AnvilFolder, optionally with a pool of processes.
+
+The work is split by region: a worker opens one region(AnvilFile),
+calls a function on every chunk and sends back the results.
+With more than one process, the function and its results must be picklable:
+use module level functions, bound to their parameters with `functools.partial`.
+Results are always returned in the same order, sorted by region.
+
+With a `ScanCache` the results are stored per chunk,
+the next scans call the function only on the chunks changed in the meantime.
+
+A scan can declare the `paths` of the tags read by the function (see `minenbt.nbt`),
+only those tags are decoded. A `ChunkFilter` skips chunks by their top-level tags."""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial, reduce
+from typing import TYPE_CHECKING, Any, Callable
+
+from .file_formats import AnvilFile, Chunk, ChunkFilter
+from .utils import Coord, near_regions
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pathlib import Path
+
+    from .index import ScanCache
+    from .savefolder import AnvilFolder
+
+__all__ = ["map_chunks", "reduce_chunks"]
+
+ChunkFunction = Callable[[Coord, Chunk], Any]
+# region x, z, file, chunks to read (None = all)
+_Item = tuple[int, int, "Path", "list[tuple[int, int]] | None"]
+
+
+def _in_range(
+    rx: int,
+    rz: int,
+    coords: "Iterable[tuple[int, int]]",
+    center: tuple[int, int, int] | None,
+    distance: int | None,
+) -> list[tuple[int, int]]:
+    if center is None or distance is None:
+        return list(coords)
+    start = Coord(center[0], 0, center[2])
+    return [c for c in coords if start.distance(Coord.compose((rx, rz), c)) <= distance]
+
+
+def _map_region(
+    func: ChunkFunction, center, distance, paths, chunk_filter, item: _Item
+) -> list[tuple[Coord, Any]]:
+    """Return `coord, result` for every chunk of the region, results can be None."""
+    rx, rz, path, coords = item
+    region = AnvilFile(path)
+    bulk = coords is None and center is None
+    coords = _in_range(rx, rz, region.xzs() if coords is None else coords, center, distance)
+    results = []
+    chunks = region.read_chunks(
+        coords, cache=False, paths=paths, chunk_filter=chunk_filter, bulk=bulk
+    )
+    for (cx, cz), chunk in chunks.items():
+        if chunk:
+            coord = Coord.compose((rx, rz), (cx, cz))
+            results.append((coord, func(coord, chunk)))
+    region.close()
+    return sorted(results)
+
+
+def _reduce_region(
+    func: ChunkFunction,
+    merge: Callable[[Any, Any], Any],
+    center,
+    distance,
+    paths,
+    chunk_filter,
+    item: _Item,
+):
+    results = _map_region(func, center, distance, paths, chunk_filter, item)
+    results = [r for _, r in results if r is not None]
+    if not results:
+        return None
+    return reduce(merge, results)
+
+
+def _regions(
+    folder: "AnvilFolder", center: tuple[int, int, int] | None, distance: int | None
+) -> list[tuple[int, int]]:
+    xzs = sorted(folder.xzs())
+    if center is not None and distance is not None:
+        near = set(near_regions(center[0], center[2], distance))
+        xzs = [xz for xz in xzs if xz in near]
+    return xzs
+
+
+def _run(
+    worker: Callable[[_Item], Any],
+    items: list[_Item],
+    jobs: int | None,
+    progress: Callable[[int, int], None] | None,
+) -> "Iterator[Any]":
+    if jobs == 1:
+        results: "Iterable[Any]" = map(worker, items)
+        for i, result in enumerate(results):
+            if progress:
+                progress(i + 1, len(items))
+            yield result
+        return
+    with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+        for i, result in enumerate(executor.map(worker, items)):
+            if progress:
+                progress(i + 1, len(items))
+            yield result
+
+
+def _map_incremental(
+    folder: "AnvilFolder",
+    worker: Callable[[_Item], list[tuple[Coord, Any]]],
+    jobs: int | None,
+    center: tuple[int, int, int] | None,
+    distance: int | None,
+    progress: Callable[[int, int], None] | None,
+    cache: "ScanCache",
+) -> "Iterator[tuple[Coord, Any]]":
+    items = []
+    versions = []
+    for rx, rz in _regions(folder, center, distance):
+        # only the header is read
+        region = AnvilFile(folder.path(rx, rz))
+        current = {}
+        for cx, cz in region.xzs():
+            metadata = region.metadata(cx, cz)
+            current[cx, cz] = (metadata.timestamp, metadata.offset)
+        stored = cache.versions(rx, rz)
+        changed = [c for c in current if stored.get(c) != current[c]]
+        items.append((rx, rz, folder.path(rx, rz), _in_range(rx, rz, changed, center, distance)))
+        versions.append(current)
+    results_by_region = _run(worker, items, jobs, progress)
+    for (rx, rz, _, changed), current, results in zip(items, versions, results_by_region):
+        # changed chunks without a result (es: now rejected by the filter) drop the stored one
+        new_results = dict.fromkeys(changed)
+        new_results.update((coord.chunk(), result) for coord, result in results)
+        cache.store(rx, rz, current, new_results)
+        stored = cache.results(rx, rz)
+        for cx, cz in sorted(_in_range(rx, rz, stored, center, distance)):
+            if stored[cx, cz] is not None:
+                yield Coord.compose((rx, rz), (cx, cz)), stored[cx, cz]
+
+
+def map_chunks(
+    folder: "AnvilFolder",
+    func: ChunkFunction,
+    jobs: int | None = 1,
+    center: tuple[int, int, int] | None = None,
+    distance: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+    cache: "ScanCache | None" = None,
+    paths: "Iterable[str] | None" = None,
+    chunk_filter: ChunkFilter | None = None,
+) -> "Iterator[tuple[Coord, Any]]":
+    """Call `func(coord, chunk)` on every chunk, yield `coord, result` when result is not None.
+
+    `coord` is the origin of the chunk.
+    `jobs` is the number of processes (`None` or 0 = one per CPU, 1 = no pool).
+    With `center` and `distance` only chunks within `distance` from `center` are read.
+    `progress(done, total)` is called after every region.
+    With `cache` only the chunks changed since the previous scan are read,
+    the results of the other ones come from `cache`.
+    With `paths` only those tags of the chunks are decoded (see `AnvilFile.read_chunks`),
+    with `chunk_filter` only the accepted chunks are passed to `func`."""
+    paths = None if paths is None else tuple(paths)
+    worker = partial(_map_region, func, center, distance, paths, chunk_filter)
+    if cache is not None:
+        yield from _map_incremental(folder, worker, jobs, center, distance, progress, cache)
+        return
+    items = [(rx, rz, folder.path(rx, rz), None) for rx, rz in _regions(folder, center, distance)]
+    for results in _run(worker, items, jobs, progress):
+        yield from ((coord, result) for coord, result in results if result is not None)
+
+
+def reduce_chunks(
+    folder: "AnvilFolder",
+    func: ChunkFunction,
+    merge: Callable[[Any, Any], Any],
+    jobs: int | None = 1,
+    center: tuple[int, int, int] | None = None,
+    distance: int | None = None,
+    progress: Callable[[int, int], None] | None = None,
+    cache: "ScanCache | None" = None,
+    paths: "Iterable[str] | None" = None,
+    chunk_filter: ChunkFilter | None = None,
+) -> Any:
+    """Call `func(coord, chunk)` on every chunk and merge the results with `merge(a, b)`.
+
+    Results are merged within every region by the workers, then across regions
+    (with `cache`, every result is merged by this process).
+    Returns None if there are no results. See `map_chunks` for the other parameters."""
+    if cache is not None:
+        partials: "Iterable[Any]" = (
+            r
+            for _, r in map_chunks(
+                folder, func, jobs, center, distance, progress, cache, paths, chunk_filter
+            )
+        )
+    else:
+        paths = None if paths is None else tuple(paths)
+        worker = partial(_reduce_region, func, merge, center, distance, paths, chunk_filter)
+        items = [
+            (rx, rz, folder.path(rx, rz), None) for rx, rz in _regions(folder, center, distance)
+        ]
+        partials = (p for p in _run(worker, items, jobs, progress) if p is not None)
+    result = None
+    for p in partials:
+        result = p if result is None else merge(result, p)
+    return result
@@ -1,13 +1,26 @@
-import bisect
-from math import floor, sqrt
+import heapq
+from math import sqrt
 from math import pow as mpow
-from typing import NamedTuple
+from typing import TYPE_CHECKING, ClassVar, NamedTuple
 from uuid import UUID
 
 import numpy as np
 from amulet_nbt import CompoundTag, IntArrayTag
 
-__all__ = ["Coord", "near_regions", "near_chunks", "parse_uuid"]
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+__all__ = [
+    "Coord",
+    "near_regions",
+    "chunk_rings",
+    "near_chunks",
+    "parse_uuid",
+    "unpack_longs",
+    "pack_longs",
+    "Interner",
+    "Histogram",
+]
 
 
 class Coord(NamedTuple):
@@ -47,44 +60,51 @@ def near_regions(x, z, distance) -> list[tuple[int, int]]:
     centered on (x, z).
 
     You can pass the returned values to `minenbt.Dimension.region`"""
-    c = Coord(x, 0, z)
-    center_region = c.region()
-    regions = [center_region]
     cp = Coord(x + distance, 0, z + distance).region()
     cm = Coord(x - distance, 0, z - distance).region()
-    for dx in range(cm[0], cp[0] + 1):
-        for dy in range(cm[1], c[1] + 1):
-            regions.append((center_region[0] + dx, center_region[1] + dy))
-    return regions
+    return [(rx, rz) for rx in range(cm[0], cp[0] + 1) for rz in range(cm[1], cp[1] + 1)]
+
+
+def chunk_rings(x, z) -> "Iterator[list[tuple[int, int]]]":
+    """Yield, ring by ring, the (chunk x, chunk z) of the chunks around the block `(x, z)`.
+
+    Ring `k` is made of the chunks `k` chunks away (on x or z)
+    from the chunk containing the block. It never ends."""
+    ccx, ccz = x >> 4, z >> 4
+    yield [(ccx, ccz)]
+    k = 1
+    while True:
+        ring = [(ccx + d, ccz - k) for d in range(-k, k + 1)]
+        ring += [(ccx + d, ccz + k) for d in range(-k, k + 1)]
+        ring += [(ccx - k, ccz + d) for d in range(-k + 1, k)]
+        ring += [(ccx + k, ccz + d) for d in range(-k + 1, k)]
+        yield ring
+        k += 1
+
 
+def near_chunks(x, z, distance) -> "Iterator[Coord]":
+    """Yield a Coord for every chunk, from nearest to farthest.
+    Every returned Coord has a distance from `(x,z)` lesser than `distance`.
 
-def near_chunks(x, z, distance) -> list[Coord]:
-    """Return an list of Coord, from nearest to farthest, one Coord for every chunck.
-    Every returned Coord has a distance from `(x,z)` lesser than `distance`."""
+    Chunks are generated ring by ring (see `chunk_rings`),
+    only the chunks of the last rings are kept in memory."""
     start = Coord(x, 0, z)
-    srx, srz = start.region()
-    results = []
-    xregion_range = floor(distance / 512)
-    zregion_range = xregion_range
-    # distance from borders
-    dx = x % 512
-    if min(abs(dx - 512), dx) < distance % 512:
-        xregion_range += 1
-    dz = z % 512
-    if min(abs(dz - 512), dz) < distance % 512:
-        zregion_range += 1
-    # iterate every regions in range
-    for rx in range(-xregion_range, xregion_range + 1):
-        for rz in range(-zregion_range, zregion_range + 1):
-            # iterate every chunk in regions
-            for cx in range(0, 33):
-                for cz in range(0, 33):
-                    point = Coord.compose((rx + srx, rz + srz), (cx, cz), 0)
-                    results.append((point, start.distance(point)))
-    results = sorted(results, key=lambda k: k[1])
-    nbisect = bisect.bisect_right([r[1] for r in results], distance)
-    results = results[:nbisect]
-    return [r[0] for r in results]
+    heap: list[tuple[float, Coord]] = []
+    for k, ring in enumerate(chunk_rings(x, z)):
+        # a chunk of the ring k is at least 16 * k - 15 blocks away
+        if 16 * k - 15 > distance:
+            break
+        for cx, cz in ring:
+            point = Coord(cx << 4, 0, cz << 4)
+            point_distance = start.distance(point)
+            if point_distance <= distance:
+                heapq.heappush(heap, (point_distance, point))
+        # the chunks of the next rings are farther than this
+        bound = 16 * (k + 1) - 15
+        while heap and heap[0][0] <= bound:
+            yield heapq.heappop(heap)[1]
+    while heap:
+        yield heapq.heappop(heap)[1]
 
 
 def parse_uuid(compound: CompoundTag, prefix="UUID") -> UUID:
@@ -99,3 +119,169 @@ def parse_uuid(compound: CompoundTag, prefix="UUID") -> UUID:
     uints = [np.int32(i).astype(np.uint32).item() for i in ints.np_array]
     # build 128 bit integer
     return UUID(int=(uints[0] << 96) + (uints[1] << 64) + (uints[2] << 32) + uints[3])
+
+
+def unpack_longs(longs, nbit: int, count: int, dtype=np.uint16) -> np.ndarray:
+    """Unpack `count` values of `nbit` bits each from an array of 64-bit longs.
+
+    Values never span two longs: every long holds `64 // nbit` values,
+    starting from the least significant bits, the remaining high bits are unused.
+    Returns a flat array of `dtype` (default `uint16`)."""
+    if not 0 < nbit < 16:
+        raise ValueError(f"Unsupported bits per entry: {nbit}")
+    per_long = 64 // nbit
+    data = np.asarray(longs, dtype=np.int64).view(np.uint64)
+    if len(data) * per_long < count:
+        raise ValueError("There are {} 64-bit fields but {} states".format(len(data), count))
+    shifts = np.arange(per_long, dtype=np.uint64) * np.uint64(nbit)
+    values = (data[:, np.newaxis] >> shifts[np.newaxis, :]) & np.uint64((1 << nbit) - 1)
+    return values.reshape(-1)[:count].astype(dtype)
+
+
+def pack_longs(values, nbit: int) -> np.ndarray:
+    """Pack `values` of `nbit` bits each in 64-bit longs, the inverse of `unpack_longs`.
+
+    Every long holds `64 // nbit` values, the last one is padded with zeros.
+    Returns an array of `int64`, as stored in a `LongArrayTag`."""
+    if not 0 < nbit < 16:
+        raise ValueError(f"Unsupported bits per entry: {nbit}")
+    per_long = 64 // nbit
+    values = np.asarray(values).reshape(-1)
+    if values.size and int(values.max()) >> nbit:
+        raise ValueError(f"Values don't fit in {nbit} bits")
+    padded = np.zeros(-(-values.size // per_long) * per_long, dtype=np.uint64)
+    padded[: values.size] = values
+    shifts = np.arange(per_long, dtype=np.uint64) * np.uint64(nbit)
+    longs = np.bitwise_or.reduce(padded.reshape(-1, per_long) << shifts[np.newaxis, :], axis=1)
+    return longs.view(np.int64)
+
+
+class Interner:
+    """Map strings (es: biome or block ids) to small integers, in order of appearance.
+
+    Instances are registered by `key`: when pickled only the key is sent,
+    the receiving process uses its own instance with the same key."""
+
+    _registry: ClassVar[dict[str, "Interner"]] = {}
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self._ids: dict[str, int] = {}
+        self._names: list[str] = []
+        Interner._registry[key] = self
+
+    @classmethod
+    def get(cls, key: str) -> "Interner":
+        """Return the instance registered as `key`, create it if needed."""
+        if key not in cls._registry:
+            return cls(key)
+        return cls._registry[key]
+
+    def __reduce__(self):
+        return Interner.get, (self.key,)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __repr__(self) -> str:
+        return f"Interner({self.key!r})"
+
+    def id(self, name: str) -> int:
+        """Return the id of `name`, a new one if never seen."""
+        if name not in self._ids:
+            self._ids[name] = len(self._names)
+            self._names.append(name)
+        return self._ids[name]
+
+    def ids(self, names: "Iterable[str]") -> np.ndarray:
+        """Return the ids of `names` as an array, useful to map a palette."""
+        return np.array([self.id(n) for n in names], dtype=np.uint32)
+
+    def name(self, i: int) -> str:
+        """Return the string with id `i`."""
+        return self._names[i]
+
+
+class Histogram:
+    """Counts of `(y, id)` pairs, `id` from an `Interner`.
+
+    Counts are kept in a 2D array (`y - ymin`, `id`), grown when needed.
+    When pickled ids are replaced by names, so histograms built by different processes
+    (es: by scan workers) can be merged with `+`."""
+
+    def __init__(self, interner: Interner) -> None:
+        self.interner = interner
+        self.ymin = 0
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+
+    def __grow(self, ymin: int, ymax: int, nids: int) -> None:
+        if self.counts.size:
+            ymin = min(ymin, self.ymin)
+            ymax = max(ymax, self.ymin + self.counts.shape[0] - 1)
+        nids = max(nids, self.counts.shape[1])
+        if (ymin, ymax - ymin + 1, nids) == (self.ymin, *self.counts.shape):
+            return
+        counts = np.zeros((ymax - ymin + 1, nids), dtype=np.int64)
+        if self.counts.size:
+            dy = self.ymin - ymin
+            counts[dy : dy + self.counts.shape[0], : self.counts.shape[1]] = self.counts
+        self.ymin = ymin
+        self.counts = counts
+
+    def add(self, ys: np.ndarray, ids: np.ndarray) -> None:
+        """Count every `(ys[i], ids[i])` pair, `ys` and `ids` have the same shape."""
+        if not ids.size:
+            return
+        ys = np.asarray(ys, dtype=np.int64).reshape(-1)
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        ymin, ymax = int(ys.min()), int(ys.max())
+        self.__grow(ymin, ymax, len(self.interner))
+        nids = self.counts.shape[1]
+        counts = np.bincount((ys - ymin) * nids + ids, minlength=(ymax - ymin + 1) * nids)
+        dy = ymin - self.ymin
+        self.counts[dy : dy + ymax - ymin + 1] += counts.reshape(-1, nids)
+
+    def add_counts(self, ymin: int, ids: np.ndarray, counts: np.ndarray) -> None:
+        """Add a (y, column) `counts` array, column `i` is id `ids[i]` and row 0 is `ymin`.
+
+        `ids` can repeat, es: when a palette maps more entries to the same id."""
+        if not counts.size:
+            return
+        ymax = ymin + counts.shape[0] - 1
+        self.__grow(ymin, ymax, int(np.max(ids)) + 1)
+        dy = ymin - self.ymin
+        np.add.at(self.counts[dy : dy + counts.shape[0]], (slice(None), ids), counts)
+
+    def __add__(self, other: "Histogram") -> "Histogram":
+        result = Histogram(self.interner)
+        for h in (self, other):
+            if h.counts.size:
+                result.__grow(h.ymin, h.ymin + h.counts.shape[0] - 1, h.counts.shape[1])
+                dy = h.ymin - result.ymin
+                result.counts[dy : dy + h.counts.shape[0], : h.counts.shape[1]] += h.counts
+        return result
+
+    def totals(self) -> dict[str, int]:
+        """Return the total count of every id (by name), from the most common."""
+        totals = self.counts.sum(axis=0)
+        return {
+            self.interner.name(i): int(totals[i]) for i in np.argsort(-totals, kind="stable")
+            if totals[i]
+        }
+
+    def __getstate__(self):
+        used = np.flatnonzero(self.counts.any(axis=0)) if self.counts.size else []
+        return {
+            "interner": self.interner,
+            "ymin": self.ymin,
+            "names": [self.interner.name(i) for i in used],
+            "counts": self.counts[:, used] if self.counts.size else self.counts,
+        }
+
+    def __setstate__(self, state) -> None:
+        self.interner = state["interner"]
+        self.ymin = state["ymin"]
+        ids = self.interner.ids(state["names"])
+        self.counts = np.zeros((state["counts"].shape[0], len(self.interner)), dtype=np.int64)
+        if len(ids):
+            self.counts[:, ids] = state["counts"]
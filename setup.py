@@ -15,7 +15,6 @@ build_exe_options = {
         "email",
         "html",
         "http",
-        "multiprocessing",
         "mypy",
         "numpy.distutils",
         "numpy.doc",
@@ -31,7 +30,6 @@ build_exe_options = {
         "xml",
         "_bz2",
         "_lzma",
-        "_socket",
         "_ssl",
     ],
     "includes": [
@@ -0,0 +1,195 @@
+"""A small synthetic save folder, written with minenbt itself."""
+from pathlib import Path
+
+import numpy
+import pytest
+from amulet_nbt import (
+    ByteTag,
+    CompoundTag,
+    DoubleTag,
+    IntArrayTag,
+    IntTag,
+    ListTag,
+    LongArrayTag,
+    LongTag,
+    NamedTag,
+    StringTag,
+)
+
+from minenbt import SaveFolder
+from minenbt.file_formats import AnvilFile, Chunk
+from minenbt.utils import pack_longs
+
+DATA_VERSION = 3120
+
+
+def palette_entry(block: str) -> CompoundTag:
+    """`name[k=v,...]` -> block state compound."""
+    name, _, properties = block.rstrip("]").partition("[")
+    entry = CompoundTag({"Name": StringTag(name)})
+    if properties:
+        entry["Properties"] = CompoundTag(
+            {k: StringTag(v) for k, v in (p.split("=") for p in properties.split(","))}
+        )
+    return entry
+
+
+def section_tag(y: int, palette: list[str], states=None, biomes=("minecraft:plains",)):
+    """A section, `states` are (y, z, x) palette indexes (None = a single entry palette)."""
+    block_states = CompoundTag({"palette": ListTag([palette_entry(b) for b in palette])})
+    if states is not None:
+        nbit = max(4, (len(palette) - 1).bit_length())
+        block_states["data"] = LongArrayTag(pack_longs(numpy.asarray(states).reshape(-1), nbit))
+    return CompoundTag(
+        {
+            "Y": ByteTag(y),
+            "block_states": block_states,
+            "biomes": CompoundTag({"palette": ListTag([StringTag(b) for b in biomes])}),
+        }
+    )
+
+
+def chunk_tag(
+    cx: int, cz: int, sections: list[CompoundTag], inhabited=0, light_section=True
+) -> Chunk:
+    """A chunk, with `light_section` the first section is a light-only one below `sections`."""
+    if light_section:
+        sections = [CompoundTag({"Y": ByteTag(sections[0]["Y"].py_int - 1)})] + sections
+    return Chunk(
+        {
+            "DataVersion": IntTag(DATA_VERSION),
+            "xPos": IntTag(cx),
+            "zPos": IntTag(cz),
+            "Status": StringTag("minecraft:full"),
+            "InhabitedTime": LongTag(inhabited),
+            "LastUpdate": LongTag(0),
+            "sections": ListTag(sections),
+        }
+    )
+
+
+def entity_tag(entity_id: str, x: float, y: float, z: float, **tags) -> CompoundTag:
+    return CompoundTag(
+        {
+            "id": StringTag(entity_id),
+            "Pos": ListTag([DoubleTag(x), DoubleTag(y), DoubleTag(z)]),
+            "UUID": IntArrayTag([1, 2, 3, int(x) * 1000 + int(z)]),
+            **tags,
+        }
+    )
+
+
+def write_region(path: Path, chunks: "dict[tuple[int, int], Chunk]") -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\0" * 8192)
+    region = AnvilFile(path)
+    for (x, z), chunk in chunks.items():
+        region.set_chunk(x, z, chunk)
+    region.save()
+    region.close()
+
+
+def ore_states(seed: int) -> numpy.ndarray:
+    """Stone with some diamond ore (index 1), air (index 2) in the top layer."""
+    states = numpy.zeros((16, 16, 16), dtype=numpy.int64)
+    states.reshape(-1)[seed::97] = 1
+    states[15] = 2
+    return states
+
+
+def write_level_dat(folder: Path) -> None:
+    """A single player level.dat, the player is at 0.5, 64, 0.5 in the Overworld."""
+    NamedTag(
+        CompoundTag(
+            {
+                "Data": CompoundTag(
+                    {
+                        "LevelName": StringTag("test"),
+                        "Player": CompoundTag(
+                            {
+                                "Pos": ListTag([DoubleTag(0.5), DoubleTag(64), DoubleTag(0.5)]),
+                                "Dimension": StringTag("minecraft:overworld"),
+                            }
+                        ),
+                    }
+                )
+            }
+        )
+    ).save_to(str(folder / "level.dat"))
+
+
+@pytest.fixture
+def save_folder(tmp_path: Path) -> SaveFolder:
+    """Two regions of stone and ores, plains and a forest; cows and a chest minecart at y 64."""
+    write_level_dat(tmp_path)
+    palette = ["minecraft:stone", "minecraft:diamond_ore", "minecraft:air"]
+    for rx in (0, 1):
+        chunks = {}
+        for cx in range(3):
+            for cz in range(2):
+                biome = "minecraft:forest" if rx == 1 and cz == 1 else "minecraft:plains"
+                sections = [
+                    section_tag(y, palette, ore_states(cx + cz + y), biomes=(biome,))
+                    for y in range(4)
+                ]
+                chunks[cx, cz] = chunk_tag(cx, cz, sections, inhabited=cx * 100)
+        write_region(tmp_path / "region" / f"r.{rx}.0.mca", chunks)
+    entities = {
+        (0, 0): CompoundTag(
+            {
+                "DataVersion": IntTag(DATA_VERSION),
+                "Entities": ListTag(
+                    [
+                        entity_tag("minecraft:cow", 3.5, 64, 4.5, Brain=CompoundTag()),
+                        entity_tag("minecraft:cow", 10.5, 64, 12.5, Brain=CompoundTag()),
+                        entity_tag(
+                            "minecraft:chest_minecart",
+                            5.5,
+                            64,
+                            5.5,
+                            Items=ListTag(
+                                [
+                                    CompoundTag(
+                                        {
+                                            "id": StringTag("minecraft:apple"),
+                                            "Count": ByteTag(3),
+                                        }
+                                    )
+                                ]
+                            ),
+                        ),
+                    ]
+                ),
+            }
+        ),
+        (2, 1): CompoundTag(
+            {
+                "DataVersion": IntTag(DATA_VERSION),
+                "Entities": ListTag(
+                    [entity_tag("minecraft:sheep", 40.5, 70, 20.5, Brain=CompoundTag())]
+                ),
+            }
+        ),
+    }
+    write_region(
+        tmp_path / "entities" / "r.0.0.mca", {c: Chunk(e) for c, e in entities.items()}
+    )
+    return SaveFolder(tmp_path)
+
+
+@pytest.fixture
+def deep_save_folder(tmp_path: Path) -> SaveFolder:
+    """A single chunk from y -64 to -1, without a light-only section: `sections[0]` is Y -4.
+
+    Stone with diamond ore (at 0, -64, 0 too), the bottom section is a forest."""
+    write_level_dat(tmp_path)
+    palette = ["minecraft:stone", "minecraft:diamond_ore", "minecraft:air"]
+    biomes = {-4: ("minecraft:forest",)}
+    sections = [
+        section_tag(y, palette, ore_states(0), biomes=biomes.get(y, ("minecraft:plains",)))
+        for y in range(-4, 0)
+    ]
+    write_region(
+        tmp_path / "region" / "r.0.0.mca", {(0, 0): chunk_tag(0, 0, sections, light_section=False)}
+    )
+    return SaveFolder(tmp_path)
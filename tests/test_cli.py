@@ -0,0 +1,118 @@
+import csv
+import json
+
+import pytest
+
+from minenbt.cli import biome_analysis, blockstats, containers_list, mobs_list, slime
+from minenbt.file_formats import AnvilFile
+from minenbt.utils import Coord
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"jobs": 2}, {"by_y": True}, {"incremental": True}],
+    ids=["default", "jobs", "by_y", "incremental"],
+)
+def test_biome(save_folder, capsys, options):
+    for _ in range(2 if options.get("incremental") else 1):
+        assert biome_analysis.main(save_folder, "overworld", **options) == 0
+        out = capsys.readouterr().out
+        # 2 regions × 6 chunks × 4 sections × 64 cells, a quarter of the chunks are forest
+        assert "minecraft:plains :        2,304 75.00%" in out
+        assert "minecraft:forest :          768 25.00%" in out
+    if options.get("by_y"):
+        assert out.count("minecraft:plains :") == 5
+
+
+def test_blockstats(save_folder, capsys, tmp_path):
+    csv_file, json_file = tmp_path / "ores.csv", tmp_path / "ores.json"
+    assert (
+        blockstats.main(
+            save_folder,
+            "overworld",
+            None,
+            None,
+            ["*_ore", "stone"],
+            jobs=2,
+            csv_file=str(csv_file),
+            json_file=str(json_file),
+        )
+        == 0
+    )
+    out = capsys.readouterr().out
+    report = json.loads(json_file.read_text())
+    total = sum(report["minecraft:diamond_ore"]["y"].values())
+    assert report["minecraft:diamond_ore"]["total"] == total > 0
+    # 12 chunks × 4 sections × 15 layers of stone or ore
+    assert total + report["minecraft:stone"]["total"] == 12 * 4 * 15 * 256
+    assert "minecraft:air" not in report
+    assert f"minecraft:diamond_ore : {total:>14,d} (y 0 to 62)" in out
+    rows = list(csv.reader(csv_file.open()))
+    assert rows[0] == ["block", "y", "count"]
+    assert sum(int(c) for b, _, c in rows[1:] if b == "minecraft:diamond_ore") == total
+
+
+def test_find_patches(save_folder):
+    regions = save_folder.overworld().regions
+    patches = list(
+        biome_analysis.find_patches(regions, "minecraft:forest", Coord(0, 64, 0), limit=2)
+    )
+    # the forest chunks of region 1, 0 are a single patch
+    assert len(patches) == 1 and patches[0].complete
+    assert patches[0].columns == 3 * 4 * 4 and patches[0].nearest.x == 512 + 2
+    assert regions.cache_info().regions == 0
+
+
+def test_readers_keep_cached_regions(save_folder):
+    regions = save_folder.overworld().regions
+    region = regions.single(1, 0)
+    region.chunk(0, 1).find_section(0).set_block(0, 0, 0, "minecraft:gold_block")
+    size = regions.path(1, 0).stat().st_size
+    list(biome_analysis.find_patches(regions, "minecraft:forest", Coord(0, 64, 0), limit=2))
+    assert len(slime.generated_chunks(regions, None, None)[0]) == 12
+    # the edit of the caller is neither saved nor dropped
+    assert regions.single(1, 0) is region and region.dirty
+    assert regions.path(1, 0).stat().st_size == size
+    assert AnvilFile(regions.path(1, 0)).chunk(0, 1).find_section(0).block(0, 0, 0) == (
+        "minecraft:stone"
+    )
+
+
+def printed_lines(out: str) -> list[str]:
+    return sorted(out.split("\nEntities:\n", 1)[1].splitlines())
+
+
+@pytest.mark.parametrize("distance", [None, 20, 40])
+def test_mobs_index(save_folder, capsys, distance):
+    center = Coord(0, 0, 0)
+    assert mobs_list.main(save_folder, "overworld", center, distance) == 0
+    scanned = printed_lines(capsys.readouterr().out)
+    assert mobs_list.main(save_folder, "overworld", center, distance, index=True) == 0
+    assert printed_lines(capsys.readouterr().out) == scanned
+    assert len(scanned) == (3 if distance != 20 else 2)
+    assert "Cow at ((3, 64, 4)) - 64 blocks away" in scanned
+
+
+@pytest.mark.parametrize("distance", [None, 20])
+def test_containers_index(save_folder, capsys, distance):
+    center = Coord(0, 0, 0)
+    assert containers_list.main(save_folder, "overworld", center, distance, False, False) == 0
+    scanned = printed_lines(capsys.readouterr().out)
+    assert (
+        containers_list.main(save_folder, "overworld", center, distance, False, False, index=True)
+        == 0
+    )
+    assert printed_lines(capsys.readouterr().out) == scanned
+    assert scanned == ["- Apple: 3", "Chest Minecart at (6, 64, 6)"]
+
+
+def test_blockstats_bottom_section(deep_save_folder, tmp_path):
+    json_file = tmp_path / "blocks.json"
+    assert (
+        blockstats.main(deep_save_folder, "overworld", None, None, [], json_file=str(json_file))
+        == 0
+    )
+    report = json.loads(json_file.read_text())
+    assert sum(b["total"] for b in report.values()) == 4 * 4096
+    assert min(int(y) for y in report["minecraft:diamond_ore"]["y"]) == -64
+    assert report["minecraft:air"]["y"] == {str(y): 256 for y in (-49, -33, -17, -1)}
@@ -0,0 +1,84 @@
+import numpy
+import pytest
+
+from minenbt import compression
+from minenbt.compression import EXTERNAL, LZ4, _lz4_blocks, _lz4_python
+from minenbt.file_formats import AnvilFile
+
+from conftest import chunk_tag, section_tag, write_region
+
+
+def lz4_header(method: int, compressed: int, size: int) -> bytes:
+    # the checksum is not verified, any value is accepted
+    return (
+        b"LZ4Block"
+        + bytes([method])
+        + compressed.to_bytes(4, "little")
+        + size.to_bytes(4, "little")
+        + b"\xde\xad\xbe\xef"
+    )
+
+
+def lz4_stream(*blocks: tuple[int, bytes, int]) -> bytes:
+    """A lz4-java stream of `(method, block, size)` blocks, with the end of stream."""
+    out = b"".join(lz4_header(method, len(block), size) + block for method, block, size in blocks)
+    return out + lz4_header(0x10, 0, 0)
+
+
+# "ab" then a match of 10 bytes at offset 2 (overlapping), then the last literals
+OVERLAPPING = bytes([0x26]) + b"ab" + (2).to_bytes(2, "little") + bytes([0x10]) + b"c"
+
+
+def test_lz4_literals_only():
+    assert _lz4_python(bytes([0x50]) + b"hello", 5) == b"hello"
+    # 15 + 255 + 30 literals, the count continues in the next bytes
+    literals = bytes(range(256)) + bytes(range(44))
+    assert _lz4_python(bytes([0xF0, 255, 30]) + literals, 300) == literals
+
+
+def test_lz4_overlapping_match():
+    assert _lz4_python(OVERLAPPING, 13) == b"ab" * 6 + b"c"
+    with pytest.raises(ValueError):
+        _lz4_python(OVERLAPPING, 14)
+
+
+def test_lz4_library_blocks():
+    lz4_block = pytest.importorskip("lz4.block")
+    rng = numpy.random.default_rng(0)
+    # runs of repeated bytes, short and long matches
+    data = numpy.repeat(rng.integers(0, 4, 5000), rng.integers(1, 40, 5000)).astype("u1")
+    data = data.tobytes()
+    assert _lz4_python(lz4_block.compress(data, store_size=False), len(data)) == data
+
+
+def test_lz4_blocks_header(monkeypatch):
+    monkeypatch.setattr(compression, "_lz4_block", None)
+    payload = lz4_stream((0x10, b"raw ", 4), (0x2A, OVERLAPPING, 13))
+    # bytes after the end of stream are ignored
+    assert _lz4_blocks(payload + b"padding") == b"raw " + b"ab" * 6 + b"c"
+    with pytest.raises(ValueError, match="Invalid LZ4 block"):
+        _lz4_blocks(b"LZ4Blok!" + payload[8:])
+    with pytest.raises(ValueError, match="Unknown LZ4 block method"):
+        _lz4_blocks(lz4_stream((0x30, b"raw ", 4)))
+
+
+def test_external_lz4_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(compression, "_lz4_block", None)
+    path = tmp_path / "r.-1.0.mca"
+    chunk = chunk_tag(-30, 5, [section_tag(0, ["minecraft:stone", "minecraft:dirt"])])
+    write_region(path, {(2, 5): chunk})
+    region = AnvilFile(path)
+    data = chunk.to_nbt(compressed=False)
+    half = len(data) // 2
+    # only the compression type (with the external flag) is stored in the region
+    with open(path, "r+b") as mcafile:
+        mcafile.seek(region.metadata(2, 5).seek)
+        mcafile.write((1).to_bytes(4, "big") + bytes([LZ4 | EXTERNAL]))
+    region.close()
+    (tmp_path / "c.-30.5.mcc").write_bytes(
+        lz4_stream((0x10, data[:half], half), (0x10, data[half:], len(data) - half))
+    )
+    region = AnvilFile(path)
+    read = region.chunk(2, 5)
+    assert read.to_nbt(compressed=False) == data
+    assert read.find_section(0).block(0, 0, 0) == "minecraft:stone"
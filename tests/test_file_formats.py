@@ -0,0 +1,133 @@
+import os
+
+import numpy
+import pytest
+from amulet_nbt import ByteArrayTag, ListTag, LongTag
+
+from minenbt import AnvilFolder
+from minenbt.file_formats import BLOCK_IDS, BLOCK_STATES, AnvilFile, Section, block_state
+
+from conftest import chunk_tag, section_tag, write_region
+
+
+def test_global_ids_round_trip():
+    palette = ["minecraft:stone", "minecraft:oak_log[axis=x]", "minecraft:oak_log[axis=y]"]
+    states = numpy.arange(4096).reshape(16, 16, 16) % 3
+    section = Section(section_tag(0, palette, states))
+    names = numpy.array([BLOCK_IDS.name(i) for i in section.global_ids().reshape(-1).tolist()])
+    assert (names == numpy.array([p.split("[")[0] for p in palette])[states.reshape(-1)]).all()
+    with_properties = section.global_ids(properties=True).reshape(-1).tolist()
+    assert [BLOCK_STATES.name(i) for i in with_properties] == [
+        palette[s] for s in states.reshape(-1).tolist()
+    ]
+
+
+def test_set_key_keeps_block_edits(save_folder):
+    path = save_folder.overworld().regions.path(0, 0)
+    region = AnvilFile(path)
+    chunk = region.chunk(0, 0)
+    chunk.find_section(0).set_block(0, 0, 0, "minecraft:gold_block")
+    chunk["LastUpdate"] = LongTag(100)
+    assert region.save() == 1
+    region.close()
+    chunk = AnvilFile(path).chunk(0, 0)
+    assert chunk["LastUpdate"].py_int == 100
+    assert chunk.find_section(0).block(0, 0, 0) == "minecraft:gold_block"
+
+
+def test_replace_sections_after_block_edits(save_folder):
+    chunk = save_folder.overworld().regions.find_chunk(0, 0)
+    sections = chunk["sections"]
+    chunk.find_section(0).set_block(0, 0, 0, "minecraft:gold_block")
+    # the edit is written to the replaced list, not to the new one
+    chunk["sections"] = ListTag(
+        [section_tag(-1, ["minecraft:air"]), section_tag(0, ["minecraft:dirt"])]
+    )
+    assert chunk.find_section(0).block(0, 0, 0) == "minecraft:dirt"
+    assert Section(sections[1]).block(0, 0, 0) == "minecraft:gold_block"
+
+
+def open_files() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="open files listed by /proc")
+def test_mapped_regions(save_folder, monkeypatch):
+    monkeypatch.setattr(AnvilFolder, "max_mapped", 1)
+    regions = save_folder.overworld().regions
+    before = open_files()
+    for x, z, region in regions.all():
+        assert len(list(region.chunks())) == 6
+    # only the last used region is still mapped
+    assert open_files() == before + 1
+    mapped = region._AnvilFile__mmap
+    assert mapped is not None
+    for _ in range(2):
+        assert region.read_chunks([(0, 0)], cache=False)[0, 0] is not None
+        assert region._AnvilFile__mmap is mapped
+    regions.release(x, z)
+    assert open_files() == before
+
+
+def test_set_block_id_without_properties():
+    palette = ["minecraft:oak_log[axis=x]", "minecraft:stone", "minecraft:oak_log"]
+    section = Section(section_tag(0, palette[:2], numpy.zeros((16, 16, 16), dtype=int)))
+    section.set_block(0, 0, 0, "minecraft:oak_log")
+    section.set_block(1, 0, 0, "minecraft:oak_log")
+    section.set_block(2, 0, 0, "minecraft:stone")
+    section.flush()
+    states = [block_state(e) for e in section["block_states"]["palette"]]
+    assert sorted(states) == sorted(palette)
+    assert Section(section).global_ids(properties=True)[0, 0, :3].tolist() == BLOCK_STATES.ids(
+        ["minecraft:oak_log", "minecraft:oak_log", "minecraft:stone"]
+    ).tolist()
+
+
+def noise_chunk(size: int, seed=0):
+    """A chunk with `size` random (incompressible) bytes."""
+    chunk = chunk_tag(0, 0, [section_tag(0, ["minecraft:stone"])])
+    chunk["Noise"] = ByteArrayTag(numpy.random.default_rng(seed).integers(-128, 128, size))
+    return chunk
+
+
+def test_save_grow_and_move(tmp_path):
+    # any filename works as long as no chunk is external
+    path = tmp_path / "region.mca"
+    write_region(path, {(0, 0): noise_chunk(100), (1, 0): noise_chunk(100, 1)})
+    region = AnvilFile(path)
+    assert [region.metadata(x, 0)[:2] for x in (0, 1)] == [(2, 1), (3, 1)]
+    # grows within its sector
+    region.set_chunk(0, 0, noise_chunk(2000))
+    assert region.save() == 1
+    assert region.metadata(0, 0)[:2] == (2, 1)
+    # needs 2 sectors, moved after the last chunk
+    region.set_chunk(0, 0, noise_chunk(6000))
+    assert region.save() == 1
+    assert region.metadata(0, 0)[:2] == (4, 2)
+    region.close()
+    region = AnvilFile(path)
+    assert len(region.chunk(0, 0)["Noise"]) == 6000
+    assert (region.chunk(1, 0)["Noise"].np_array == noise_chunk(100, 1)["Noise"].np_array).all()
+    assert os.listdir(tmp_path) == ["region.mca"]
+
+
+def test_save_external(tmp_path):
+    path = tmp_path / "r.1.-1.mca"
+    write_region(path, {(2, 3): noise_chunk(100)})
+    region = AnvilFile(path)
+    region.set_chunk(2, 3, noise_chunk(1 << 20))
+    assert region.save() == 1
+    external = tmp_path / "c.34.-29.mcc"
+    assert external.exists() and region.metadata(2, 3).sectors == 1
+    with open(path, "rb") as mcafile:
+        mcafile.seek(region.metadata(2, 3).seek + 4)
+        assert mcafile.read(1)[0] & 128
+    region.close()
+    region = AnvilFile(path)
+    assert (region.chunk(2, 3)["Noise"].np_array == noise_chunk(1 << 20)["Noise"].np_array).all()
+    # back in the region, the external file is removed
+    region.set_chunk(2, 3, noise_chunk(100))
+    assert region.save() == 1
+    region.close()
+    assert not external.exists()
+    assert len(AnvilFile(path).chunk(2, 3)["Noise"]) == 100
@@ -0,0 +1,91 @@
+import amulet_nbt
+import pytest
+from amulet_nbt import (
+    ByteTag,
+    CompoundTag,
+    DoubleTag,
+    IntArrayTag,
+    IntTag,
+    ListTag,
+    LongTag,
+    NamedTag,
+    StringTag,
+)
+
+from minenbt.nbt import parse_paths, project, values
+
+from conftest import chunk_tag, entity_tag, ore_states, section_tag
+
+
+def test_parse_paths():
+    assert parse_paths(["DataVersion", "sections/Y", "sections/biomes/palette"]) == {
+        b"DataVersion": None,
+        b"sections": {b"Y": None, b"biomes": {b"palette": None}},
+    }
+    # a path to the whole tag wins, in any order
+    assert parse_paths(["sections/Y", "sections"]) == {b"sections": None}
+    assert parse_paths(["sections", "sections/Y"]) == {b"sections": None}
+
+
+def sample_chunk() -> CompoundTag:
+    palette = ["minecraft:stone", "minecraft:diamond_ore", "minecraft:air"]
+    chunk = chunk_tag(3, -2, [section_tag(y, palette, ore_states(y)) for y in range(2)])
+    chunk["Heightmaps"] = CompoundTag({"WORLD_SURFACE": IntArrayTag(range(37))})
+    chunk["Entities"] = ListTag([entity_tag("minecraft:cow", 1.5, 64, -2.5, Age=IntTag(-10))])
+    chunk["PostProcessing"] = ListTag([ListTag([ByteTag(1)]), ListTag([])])
+    chunk["Empty"] = ListTag([])
+    chunk["Temperature"] = DoubleTag(0.75)
+    return chunk
+
+
+def expected(tag: CompoundTag, paths) -> CompoundTag:
+    """The tags in `paths` of the fully parsed `tag`."""
+    out = CompoundTag()
+    for key, sub in paths.items():
+        name = key.decode("utf-8")
+        if name not in tag:
+            continue
+        value = tag[name]
+        if sub is not None and isinstance(value, CompoundTag):
+            value = expected(value, sub)
+        elif sub is not None and isinstance(value, ListTag) and value.list_data_type == 10:
+            value = ListTag([expected(element, sub) for element in value])
+        out[name] = value
+    return out
+
+
+@pytest.mark.parametrize("little_endian", [False, True], ids=["java", "bedrock"])
+@pytest.mark.parametrize(
+    "paths",
+    [
+        ["DataVersion", "sections/Y"],
+        ["sections/Y", "sections/biomes/palette", "Heightmaps"],
+        ["Entities/id", "Entities/Pos", "Entities/Brain/memories"],
+        ["PostProcessing/x", "Empty/x", "Temperature/x", "Status"],
+        ["Missing", "Missing/Y", "sections/Missing", "Heightmaps/Missing"],
+    ],
+)
+def test_project(paths, little_endian):
+    chunk = sample_chunk()
+    data = NamedTag(chunk).to_nbt(compressed=False, little_endian=little_endian)
+    tree = parse_paths(paths)
+    projected = amulet_nbt.load(project(data, tree, little_endian), little_endian=little_endian)
+    assert projected.compound == expected(chunk, tree)
+    # the projection of everything is the same data
+    assert project(data, parse_paths(chunk.keys()), little_endian) == data
+
+
+@pytest.mark.parametrize("little_endian", [False, True], ids=["java", "bedrock"])
+def test_values(little_endian):
+    chunk = sample_chunk()
+    chunk["InhabitedTime"] = LongTag(-(2**40))
+    chunk["Status"] = StringTag("minecraft:full")
+    data = NamedTag(chunk).to_nbt(compressed=False, little_endian=little_endian)
+    names = ["DataVersion", "Status", "InhabitedTime", "Temperature"]
+    assert values(data, names + ["Missing"], little_endian) == {
+        name: chunk[name].py_data for name in names
+    }
+    # tags that are not numbers or strings are not returned
+    assert values(data, ["sections", "Heightmaps", "xPos"], little_endian) == {"xPos": 3}
+    with pytest.raises(ValueError):
+        values(NamedTag(ListTag([])).to_nbt(compressed=False), ["DataVersion"])
@@ -0,0 +1,43 @@
+import numpy
+
+from minenbt import Dimension
+from minenbt.cli.biome_analysis import chunk_biomes, chunk_columns
+from minenbt.file_formats import BIOME_IDS
+
+
+def test_volume_bottom_section(deep_save_folder):
+    world = deep_save_folder.overworld()
+    assert world.block_at(0, -64, 0) == "minecraft:diamond_ore"
+    blocks, palette = world.volume(0, -64, 0, 15, -1, 15)
+    assert blocks.shape == (64, 16, 16)
+    assert palette[blocks[0, 0, 0]] == "minecraft:diamond_ore"
+    assert all(
+        palette[blocks[y + 64, z, x]] == world.block_at(x, y, z)
+        for x, y, z in [(0, -64, 0), (5, -60, 7), (15, -49, 15), (3, -1, 2)]
+    )
+    assert numpy.count_nonzero(blocks == 0) == 0
+
+
+def test_replace_bottom_section(deep_save_folder):
+    world = deep_save_folder.overworld()
+    expected = sum(
+        world.block_at(x, -64, z) == "minecraft:diamond_ore" for x in range(16) for z in range(16)
+    )
+    assert expected
+    replaced = world.replace(
+        ["minecraft:diamond_ore"], "minecraft:gold_block", 0, -64, 0, 15, -64, 15
+    )
+    assert replaced == expected
+    assert world.block_at(0, -64, 0) == "minecraft:gold_block"
+    # written to the region file
+    assert Dimension(world._folder).block_at(0, -64, 0) == "minecraft:gold_block"
+
+
+def test_biomes_bottom_section(deep_save_folder):
+    chunk = deep_save_folder.overworld().regions.find_chunk(0, 0)
+    histogram = chunk_biomes(None, chunk)
+    assert histogram.ymin == -16 and histogram.totals() == {
+        "minecraft:plains": 3 * 64,
+        "minecraft:forest": 64,
+    }
+    assert chunk_columns(chunk, BIOME_IDS.id("minecraft:forest")).all()
@@ -0,0 +1,36 @@
+import time
+
+from amulet_nbt import LongTag
+
+from minenbt.file_formats import AnvilFile, ChunkFilter
+from minenbt.index import ScanCache
+from minenbt.scan import map_chunks
+
+
+def inhabited(_coord, chunk):
+    return chunk["InhabitedTime"].py_int
+
+
+def test_incremental_filter_drops_rejected_chunks(save_folder, monkeypatch):
+    world = save_folder.overworld()
+    cache = ScanCache(world, "test:inhabited")
+    chunk_filter = ChunkFilter(min_inhabited=100)
+
+    def scan():
+        return [
+            (c.x, c.z, r)
+            for c, r in map_chunks(world.regions, inhabited, cache=cache, chunk_filter=chunk_filter)
+        ]
+
+    # chunks x 1 and 2 of every region, z 0 and 1
+    assert len(scan()) == 8 and (0, 0, 0) not in scan()
+    region = AnvilFile(world.regions.path(0, 0))
+    region.chunk(1, 0)["InhabitedTime"] = LongTag(0)
+    # a new timestamp, even within the same second
+    now = time.time() + 60
+    monkeypatch.setattr(time, "time", lambda: now)
+    assert region.save() == 1
+    region.close()
+    results = scan()
+    assert len(results) == 7 and (16, 0, 100) not in results
+    cache.close()
@@ -0,0 +1,42 @@
+import numpy
+import pytest
+
+from minenbt.cli.slime import check_chunk, slime_chunks
+
+
+def java_int(value: int) -> int:
+    value &= 0xFFFFFFFF
+    return value - (1 << 32) if value >> 31 else value
+
+
+def java_slime_chunk(seed: int, x: int, z: int) -> bool:
+    """The scalar formula of the game, with Python integers wrapped as Java ones."""
+    rseed = (
+        seed
+        + java_int(x * x * 0x4C1906)
+        + java_int(x * 0x5AC0DB)
+        + java_int(z * z) * 0x4307A7
+        + java_int(z * 0x5F24F)
+    ) ^ 0x3AD8025F
+    # new Random(rseed).nextInt(10)
+    state = (rseed ^ 0x5DEECE66D) & ((1 << 48) - 1)
+    while True:
+        state = (state * 0x5DEECE66D + 0xB) & ((1 << 48) - 1)
+        bits = state >> 17
+        value = bits % 10
+        if java_int(bits - value + 9) >= 0:
+            return value == 0
+
+
+@pytest.mark.parametrize("seed", [0, 12345, -4172144997902289642, 2**63 - 1, -(2**63)])
+def test_slime_chunks(seed):
+    rng = numpy.random.default_rng(seed & 0xFFFF)
+    # near the origin (negative coordinates too) and far away, where the int products overflow
+    near = numpy.mgrid[-20:20, -20:20].reshape(2, -1)
+    far = rng.integers(-1_875_000, 1_875_000, (2, 400))
+    xs, zs = numpy.concatenate([near, far], axis=1)
+    expected = [java_slime_chunk(seed, x, z) for x, z in zip(xs.tolist(), zs.tolist())]
+    assert slime_chunks(seed, xs, zs).tolist() == expected
+    # about one chunk in ten
+    assert 0.05 < numpy.mean(expected) < 0.15
+    assert check_chunk(seed, -3, -7) == java_slime_chunk(seed, -3, -7)
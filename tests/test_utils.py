@@ -0,0 +1,107 @@
+import pickle
+from math import ceil
+
+import numpy
+import pytest
+from amulet_nbt import CompoundTag, ListTag, LongArrayTag, StringTag
+
+from minenbt.file_formats import Section
+from minenbt.utils import Histogram, Interner, pack_longs, unpack_longs
+
+NBITS = range(4, 16)
+
+
+def old_unpack(longs, nbit: int) -> list[int]:
+    """The per-long loop used by `Section` before `unpack_longs`."""
+    unused = 64 % nbit
+    blength = 64 - unused
+    mask = pow(2, nbit) - 1
+    states = []
+    for longstate in longs:
+        for _i in range(0, blength, nbit):
+            states.append(longstate & mask)
+            longstate = longstate >> nbit
+    return numpy.reshape(states[: 16 * 16 * 16], [16, 16, 16]).tolist()
+
+
+def random_longs(nbit: int, seed: int) -> numpy.ndarray:
+    """Random longs (also negative) for a section packed with `nbit` bits."""
+    rng = numpy.random.default_rng(seed)
+    count = ceil(16 * 16 * 16 / (64 // nbit))
+    longs = rng.integers(-(2**63), 2**63 - 1, size=count, dtype=numpy.int64, endpoint=True)
+    longs[:2] = (-1, numpy.iinfo(numpy.int64).min)
+    return longs
+
+
+@pytest.mark.parametrize("nbit", NBITS)
+def test_unpack_longs_as_old_loop(nbit):
+    longs = random_longs(nbit, nbit)
+    states = unpack_longs(longs, nbit, 16 * 16 * 16).reshape(16, 16, 16)
+    assert states.dtype == numpy.uint16
+    assert states.tolist() == old_unpack(longs, nbit)
+
+
+@pytest.mark.parametrize("nbit", NBITS)
+def test_section_states_as_old_loop(nbit):
+    longs = random_longs(nbit, 100 + nbit)
+    palette = [f"minecraft:block_{i}" for i in range(2 ** (nbit - 1) + 1)]
+    old = numpy.array(old_unpack(longs, nbit)) % len(palette)
+    # only indexes within the palette are valid
+    longs = pack_longs(old, nbit)
+    section = Section(
+        CompoundTag(
+            {
+                "block_states": CompoundTag(
+                    {
+                        "palette": ListTag([CompoundTag({"Name": StringTag(p)}) for p in palette]),
+                        "data": LongArrayTag(longs),
+                    }
+                )
+            }
+        )
+    )
+    assert section.states()[1].tolist() == old_unpack(longs, nbit)
+    assert section.block(3, 5, 7) == palette[old[5, 7, 3]]
+
+
+def test_section_single_entry_palette():
+    section = Section(
+        CompoundTag(
+            {
+                "block_states": CompoundTag(
+                    {"palette": ListTag([CompoundTag({"Name": StringTag("minecraft:stone")})])}
+                )
+            }
+        )
+    )
+    palette, states = section.states()
+    assert palette == ("minecraft:stone",)
+    assert states.shape == (16, 16, 16) and not states.any()
+    assert section.block(15, 15, 15) == "minecraft:stone"
+
+
+@pytest.mark.parametrize("nbit", NBITS)
+def test_pack_longs_round_trip(nbit):
+    values = numpy.random.default_rng(nbit).integers(0, 2**nbit, size=16 * 16 * 16)
+    longs = pack_longs(values, nbit)
+    assert longs.dtype == numpy.int64 and len(longs) == ceil(16 * 16 * 16 / (64 // nbit))
+    assert (unpack_longs(longs, nbit, values.size) == values).all()
+    # the unused high bits are dropped
+    random = random_longs(nbit, nbit)
+    repacked = pack_longs(unpack_longs(random, nbit, (64 // nbit) * len(random)), nbit)
+    unused = numpy.uint64(((1 << 64) - 1) ^ ((1 << (64 // nbit) * nbit) - 1))
+    assert (repacked.view(numpy.uint64) == random.view(numpy.uint64) & ~unused).all()
+
+
+def test_histogram_pickle_totals():
+    interner = Interner("test-histogram")
+    histogram = Histogram(interner)
+    histogram.add(numpy.array([0, 0, 5, -3]), interner.ids(["a", "b", "b", "c"]))
+    # an id used only by another histogram is dropped when pickling
+    interner.id("unused")
+    copy = pickle.loads(pickle.dumps(histogram))
+    assert copy.interner is interner
+    assert repr(copy.interner) == "Interner('test-histogram')"
+    assert copy.totals() == {"b": 2, "a": 1, "c": 1}
+    assert (copy + histogram).totals() == {"b": 4, "a": 2, "c": 2}
+    assert copy.ymin == -3 and copy.counts.shape[0] == 9